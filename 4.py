@@ -1,62 +1,29 @@
 #!/usr/bin/env python3
 import requests, json, configparser, sys, csv
 
+from zitadel_auth import auth_from_config
+from zitadel_client import ZitadelClient
+from zitadel_profile import phase, profile_main
+
 # ====== USER INPUT ======
 TARGET_CLIENT_ID = "301926079046713354"   # the clientId whose secret you want to regenerate
-OUTPUT_FILE = sys.argv[1] if len(sys.argv) > 1 else "zitadel_apps.csv"
+OUTPUT_FILE = next((a for a in sys.argv[1:] if not a.startswith("--")), "zitadel_apps.csv")
 # ========================
 
-cfg = configparser.ConfigParser()
-cfg.read("zitadel.conf")
+with phase("config load"):
+    cfg = configparser.ConfigParser()
+    cfg.read("zitadel.conf")
 
 DOMAIN       = cfg.get("zitadel", "domain").rstrip("/")
-ACCESS_TOKEN = cfg.get("zitadel", "access_token")
 ORG_ID       = cfg.get("zitadel", "org_id")
 
-HEADERS = {
-    "Authorization": f"Bearer {ACCESS_TOKEN}",
-    "x-zitadel-orgid": ORG_ID,
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-}
-
-def _page(endpoint, payload_key_result_candidates=("result",), limit=200):
-    """Generic pager for Zitadel management search endpoints."""
-    offset = 0
-    while True:
-        payload = {"limit": limit, "offset": offset, "asc": True, "queries": []}
-        r = requests.post(endpoint, headers=HEADERS, json=payload, timeout=30)
-        r.raise_for_status()
-        data = r.json()
-        # Try common keys ("result", or a plural like "projects"/"apps")
-        chunk = None
-        for k in payload_key_result_candidates:
-            if k in data:
-                chunk = data[k]
-                break
-        if chunk is None:
-            # try plural fallbacks by endpoint guess
-            if "projects" in data:
-                chunk = data["projects"]
-            elif "apps" in data:
-                chunk = data["apps"]
-            else:
-                chunk = []
-        if not chunk:
-            return
-        for item in chunk:
-            yield item
-        if len(chunk) < limit:
-            return
-        offset += len(chunk)
+CLIENT = ZitadelClient(DOMAIN, auth_from_config(cfg["zitadel"]), ORG_ID)
 
 def list_projects():
-    url = f"{DOMAIN}/management/v1/projects/_search"
-    return list(_page(url, payload_key_result_candidates=("result","projects")))
+    return list(CLIENT.search("/management/v1/projects/_search", result_keys=("result", "projects")))
 
 def list_apps(project_id):
-    url = f"{DOMAIN}/management/v1/projects/{project_id}/apps/_search"
-    return list(_page(url, payload_key_result_candidates=("result","apps")))
+    return CLIENT.search(f"/management/v1/projects/{project_id}/apps/_search", result_keys=("result", "apps"))
 
 def pick_client_id(app):
     return (
@@ -88,13 +55,12 @@ def generate_secret(project_id, app_id, oidc=True):
         regen_url = f"{DOMAIN}/management/v1/projects/{project_id}/apps/{app_id}/oidc_config/_generate_client_secret"
     else:
         regen_url = f"{DOMAIN}/management/v1/projects/{project_id}/apps/{app_id}/api_config/_generate_client_secret"
-    r = requests.post(regen_url, headers=HEADERS, json={}, timeout=30)
-    r.raise_for_status()
-    data = r.json()
+    data = CLIENT.post(regen_url, {})
     return data.get("clientSecret") or data.get("secret") or data.get("value")
 
 def main():
-    projects = list_projects()
+    with phase("project listing"):
+        projects = list_projects()
     if not projects:
         print("No projects found in organization.", file=sys.stderr)
         sys.exit(1)
@@ -111,36 +77,37 @@ def main():
             project_id = p.get("id") or ""
             project_name = p.get("name") or ""
             try:
-                apps = list_apps(project_id)
+                # a listing that fails part-way keeps the rows already written
+                for app in list_apps(project_id):
+                    with phase("normalization"):
+                        app_id = app.get("id") or ""
+                        app_name = pick_app_name(app)
+                        app_type = pick_app_type(app)
+                        client_id = str(pick_client_id(app))
+                    new_secret = ""
+
+                    if client_id and client_id == str(TARGET_CLIENT_ID):
+                        try:
+                            with phase("rotation"):
+                                new_secret = generate_secret(project_id, app_id, oidc=is_oidc_app(app))
+                        except requests.HTTPError as e:
+                            print(f"# error generating secret for app {app_id} ({client_id}): {e}", file=sys.stderr)
+
+                    row = [ORG_ID, project_id, project_name, app_id, app_name,client_id, new_secret]
+                    rows.append(row)
+                    with phase("csv writing"):
+                        # print to screen
+                        print(",".join(item if item is not None else "" for item in row))
+                        # write to file
+                        writer.writerow(row)
             except requests.HTTPError as e:
                 print(f"# error listing apps for project {project_id}: {e}", file=sys.stderr)
-                continue
-
-            for app in apps:
-                app_id = app.get("id") or ""
-                app_name = pick_app_name(app)
-                app_type = pick_app_type(app)
-                client_id = str(pick_client_id(app))
-                new_secret = ""
-
-                if client_id and client_id == str(TARGET_CLIENT_ID):
-                    try:
-                        new_secret = generate_secret(project_id, app_id, oidc=is_oidc_app(app))
-                    except requests.HTTPError as e:
-                        print(f"# error generating secret for app {app_id} ({client_id}): {e}", file=sys.stderr)
-
-                row = [ORG_ID, project_id, project_name, app_id, app_name,client_id, new_secret]
-                rows.append(row)
-                # print to screen
-                print(",".join(item if item is not None else "" for item in row))
-                # write to file
-                writer.writerow(row)
 
     print(f"\nWrote {len(rows)} rows to {OUTPUT_FILE}")
 
 if __name__ == "__main__":
     try:
-        main()
+        profile_main(main)
     except requests.HTTPError as e:
         msg = getattr(e.response, "text", str(e))
         print(f"HTTP error: {msg}", file=sys.stderr)
@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 import requests, json, configparser, sys, csv, os
 
+from inventory_daemon import query_daemon
+from zitadel_auth import auth_from_config
+from zitadel_client import ZitadelClient
+from zitadel_inventory import find_service_user
+
 # ============ Config ============
 TARGET_CLIENT_ID = "301926079046713354"  # rotate this one if found
 OUTPUT_CSV       = os.environ.get("ZITADEL_OUT", "zitadel_clients.csv")
@@ -9,26 +14,16 @@ cfg = configparser.ConfigParser()
 cfg.read("zitadel.conf")
 
 DOMAIN       = cfg.get("zitadel", "domain").rstrip("/")
-ACCESS_TOKEN = cfg.get("zitadel", "access_token")
 ORG_ID       = cfg.get("zitadel", "org_id")
 
-HEADERS = {
-    "Authorization": f"Bearer {ACCESS_TOKEN}",
-    "x-zitadel-orgid": ORG_ID,
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-}
+CLIENT = ZitadelClient(DOMAIN, auth_from_config(cfg["zitadel"]), ORG_ID)
 
 # ============ Helpers ============
-def http_post(url, payload):
-    r = requests.post(url, headers=HEADERS, json=payload, timeout=30)
-    r.raise_for_status()
-    return r.json()
+def http_post(url, payload, org_id=ORG_ID):
+    return CLIENT.post(url, payload, org_id=org_id)
 
 def http_put(url, payload):
-    r = requests.put(url, headers=HEADERS, json=payload, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    return CLIENT.put(url, payload)
 
 def extract(d, *keys):
     for k in keys:
@@ -50,26 +45,10 @@ def extract(d, *keys):
 
 # ============ Projects & Apps (OIDC/API) ============
 def list_projects():
-    url = f"{DOMAIN}/management/v1/projects/_search"
-    projects, offset, limit = [], 0, 200
-    while True:
-        page = http_post(url, {"limit": limit, "offset": offset, "asc": True, "queries": []})
-        chunk = page.get("result") or page.get("projects") or []
-        projects.extend(chunk)
-        if len(chunk) < limit:
-            return projects
-        offset += len(chunk)
+    return CLIENT.search("/management/v1/projects/_search", result_keys=("result", "projects"))
 
 def list_apps(project_id):
-    url = f"{DOMAIN}/management/v1/projects/{project_id}/apps/_search"
-    apps, offset, limit = [], 0, 200
-    while True:
-        page = http_post(url, {"limit": limit, "offset": offset, "asc": True, "queries": []})
-        chunk = page.get("result") or page.get("apps") or []
-        apps.extend(chunk)
-        if len(chunk) < limit:
-            return apps
-        offset += len(chunk)
+    return CLIENT.search(f"/management/v1/projects/{project_id}/apps/_search", result_keys=("result", "apps"))
 
 def pick_client_id_from_app(app):
     return (
@@ -142,29 +121,58 @@ def service_user_fields(u):
     return user_id, username, display, client_id
 
 # ============ Secret rotation ============
-def rotate_app_secret(project_id, app):
+def rotate_app_secret(project_id, app, org_id=ORG_ID):
     app_id = app.get("id")
     t = app_type_label(app)
     if t == "OIDC":
         url = f"{DOMAIN}/management/v1/projects/{project_id}/apps/{app_id}/oidc_config/_generate_client_secret"
     else:
         url = f"{DOMAIN}/management/v1/projects/{project_id}/apps/{app_id}/api_config/_generate_client_secret"
-    data = http_post(url, {})
+    data = http_post(url, {}, org_id=org_id)
     # secret field name differs by build; check multiple keys
     return extract(data, "clientSecret", "secret", "value")
 
 def rotate_service_user_secret(user_id):
     # v2 endpoint
     url = f"{DOMAIN}/v2/users/{user_id}/secret"
-    data = requests.post(url, headers=HEADERS, json={}, timeout=30)
-    data.raise_for_status()
-    payload = data.json()
+    payload = CLIENT.post(url, {})
     return extract(payload, "clientSecret", "secret", "value")
 
 # ============ Main ============
 rows = []
 new_secret_value = None
 
+# 0) Critical path: if the target resolves without a scan (inventory daemon,
+#    or one filtered user search), rotate it and show the secret right away.
+direct_rotated = {}  # resource_id -> secret or "ERROR: ..."
+hit = query_daemon("GET", f"/clients/{TARGET_CLIENT_ID}")
+if hit and hit[0] == 200:
+    # an --all-orgs daemon may find the app in another org than ORG_ID
+    target = (hit[1]["scope"], hit[1]["project_id"], hit[1]["resource"], hit[1].get("org_id") or ORG_ID)
+else:
+    try:
+        user = find_service_user(CLIENT, str(TARGET_CLIENT_ID))
+    except requests.HTTPError as e:
+        print(f"WARNING: direct lookup failed, scanning instead: {e}", file=sys.stderr)
+        user = None
+    target = ("SERVICE_USER", None, user, None) if user else None
+if target:
+    scope, pid, resource, org_id = target
+    resource_id = resource.get("id") if scope == "APP" else service_user_fields(resource)[0]
+    try:
+        if scope == "APP":
+            secret = rotate_app_secret(pid, resource, org_id) or ""
+        else:
+            secret = rotate_service_user_secret(resource_id) or ""
+        new_secret_value = secret or new_secret_value
+    except Exception as e:
+        secret = f"ERROR: {e}"
+    direct_rotated[resource_id] = secret
+    if new_secret_value:
+        print("NEW SECRET for TARGET_CLIENT_ID:", flush=True)
+        print(new_secret_value, flush=True)
+        print("(full inventory follows)\n", flush=True)
+
 # 1) Projects + Apps
 projects = list_projects()
 for p in projects:
@@ -176,8 +184,8 @@ for p in projects:
         atype  = app_type_label(app)
         client_id = pick_client_id_from_app(app) or ""
         # rotate secret ONLY for target
-        rotated = ""
-        if str(client_id) == str(TARGET_CLIENT_ID):
+        rotated = direct_rotated.get(app_id, "")
+        if str(client_id) == str(TARGET_CLIENT_ID) and app_id not in direct_rotated:
             try:
                 rotated = rotate_app_secret(pid, app) or ""
                 new_secret_value = rotated or new_secret_value
@@ -199,8 +207,9 @@ try:
     svc_users = list_service_users()
     for u in svc_users:
         user_id, username, display, client_id = service_user_fields(u)
-        rotated = ""
-        if str(client_id) == str(TARGET_CLIENT_ID) or str(user_id) == str(TARGET_CLIENT_ID):
+        rotated = direct_rotated.get(user_id, "")
+        if (str(client_id) == str(TARGET_CLIENT_ID) or str(user_id) == str(TARGET_CLIENT_ID)) \
+                and user_id not in direct_rotated:
             try:
                 rotated = rotate_service_user_secret(user_id) or ""
                 new_secret_value = rotated or new_secret_value
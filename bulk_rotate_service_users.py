@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Rotate the secrets of many service users at once.
+
+    ./bulk_rotate_service_users.py 304678892734545930 p9-service-dev-b ...
+    ./bulk_rotate_service_users.py --csv service_users.csv
+    ./bulk_rotate_service_users.py --csv service_users.csv --org 321882268895313930 --dry-run
+
+Users are given as userIds or usernames (--csv reads the user_id or
+username column of a file such as service_users.csv). Their owning orgs
+are resolved up front with a few batched v2 searches (resolve_service_users)
+instead of one GET per user; the users are then grouped by org and rotated
+concurrently, each request carrying the owning org header from the start,
+so no rotation goes through the 404 / no-header fallbacks.
+
+New secrets go to the [sink:*] sections of zitadel.conf (default: a CSV
+sink at --output) and every rotation is recorded in the ledger.
+
+With --deadline, rotations not yet started when the budget runs out are
+skipped (started ones finish) and their user ids are written to
+<output>.remaining.csv, which --csv accepts for the next run.
+"""
+import argparse
+import collections
+import configparser
+import csv
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from rotation_ledger import ledger_from_config
+from secret_sinks import CsvSink, Delivery, secret_event, sinks_from_config
+from zitadel_client import ZitadelClient
+from zitadel_deadline import PARTIAL_EXIT, Deadline, add_deadline_arg
+from zitadel_inventory import extract, resolve_service_users, service_user_fields
+from zitadel_preflight import PreflightError, require
+from zitadel_profile import phase, profile_main
+from zitadel_rotation import rotate_service_user_secret
+
+WORKERS = 8
+OUTPUT_CSV = "rotated_service_users.csv"
+
+
+def read_keys(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row.get("user_id") or row.get("username") or row.get("client_id") or ""
+                for row in csv.DictReader(f)]
+
+
+def write_remaining(output, remaining):
+    path = f"{output}.remaining.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["user_id"])
+        w.writerows([r] for r in remaining)
+    print(f"# deadline reached: {len(remaining)} users not rotated, continue with --csv {path}", file=sys.stderr)
+
+
+def group_by_org(users):
+    """{org_id: [user, ...]} by details.resourceOwner, each user once."""
+    groups, seen = collections.defaultdict(list), set()
+    for u in users:
+        user_id = service_user_fields(u)[0]
+        if user_id not in seen:
+            seen.add(user_id)
+            groups[extract(u, ["details", "resourceOwner"]) or ""].append(u)
+    return groups
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rotate many service-user secrets, grouped by owning org.")
+    ap.add_argument("users", nargs="*", help="userIds or usernames")
+    ap.add_argument("--csv", help="read users from the user_id / username column of a CSV")
+    ap.add_argument("--org", help="only rotate users owned by these orgs (comma separated)")
+    ap.add_argument("--config", default="zitadel.conf")
+    ap.add_argument("--output", default=OUTPUT_CSV, help="CSV sink used when zitadel.conf has no [sink:*]")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--dry-run", action="store_true", help="resolve and group only")
+    add_deadline_arg(ap)
+    args = ap.parse_args()
+
+    keys = list(args.users) + (read_keys(args.csv) if args.csv else [])
+    if not keys:
+        ap.error("no users given")
+    cfg = configparser.ConfigParser()
+    cfg.read(args.config)
+    client = ZitadelClient.from_config(args.config)
+    deadline = Deadline(args.deadline)
+
+    with phase("user resolution"):
+        client.deadline = deadline.share(0.3)
+        try:
+            found = resolve_service_users(client, keys)
+        except requests.Timeout:
+            if not client.deadline.expired():
+                raise
+            # out of time before anything was rotated: the whole input is left
+            write_remaining(args.output, list(dict.fromkeys(k for k in keys if k)))
+            sys.exit(PARTIAL_EXIT)
+        client.deadline = None
+    missing = [k for k in dict.fromkeys(keys) if k and k not in found]
+    for k in missing:
+        print(f"# skip {k}: no machine user with this id or username", file=sys.stderr)
+    groups = group_by_org(found.values())
+    if args.org:
+        wanted = set(args.org.split(","))
+        groups = {org: users for org, users in groups.items() if org in wanted}
+    for org, users in sorted(groups.items()):
+        print(f"# org {org or '?'}: {len(users)} users", file=sys.stderr)
+    if args.dry_run or not groups:
+        return
+
+    require(client, "user_secret")
+    ledger = ledger_from_config(cfg)
+    delivery = Delivery(sinks_from_config(cfg) or [CsvSink(args.output)])
+
+    def rotate(org_id, u):
+        user_id, _, display, client_id = service_user_fields(u)
+        if deadline.expired():
+            return None  # not started: left for the next run
+        event = secret_event("SERVICE_USER", user_id, "", client_id, display, org_id)
+        try:
+            event["secret"] = rotate_service_user_secret(client, user_id, owner=org_id or None)
+        except Exception as e:
+            ledger.record(client.domain, event, f"ERROR: {e}")
+            raise
+        ledger.record(client.domain, event, "ok")
+        delivery.publish(event)
+        return user_id
+
+    failed, remaining = 0, []
+    with phase("rotation"), ThreadPoolExecutor(max_workers=args.workers) as pool:
+        # submitted org by org, so each org's users go out back to back
+        futures = [(org, u, pool.submit(rotate, org, u)) for org, users in sorted(groups.items()) for u in users]
+        for org, u, fut in futures:
+            try:
+                user_id = fut.result()
+                if user_id is None:
+                    remaining.append(service_user_fields(u)[0])
+                else:
+                    print(f"rotated {user_id} (org {org})")
+            except Exception as e:
+                failed += 1
+                print(f"# {service_user_fields(u)[0]} failed: {e}", file=sys.stderr)
+    delivery.close()
+    total = sum(len(users) for users in groups.values())
+    print(f"# {total - failed - len(remaining)} rotated, {failed} failed, {len(missing)} not found",
+          file=sys.stderr)
+    if remaining:
+        write_remaining(args.output, remaining)
+        sys.exit(PARTIAL_EXIT)
+    if failed or delivery.failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        profile_main(main)
+    except PreflightError as e:
+        print(e, file=sys.stderr)
+        sys.exit(4)
+    except requests.HTTPError as e:
+        print("HTTP error:", getattr(e.response, "text", str(e)), file=sys.stderr)
+        sys.exit(2)
+    except Exception as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(3)
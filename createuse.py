@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 import sys, json, requests, configparser
 
+from zitadel_client import ZitadelClient
+
 cfg = configparser.ConfigParser()
 cfg.read("zitadel.conf")
 
-DOMAIN       = cfg.get("zitadel", "domain").rstrip("/")
-ACCESS_TOKEN = cfg.get("zitadel", "access_token")
-ORG_ID       = cfg.get("zitadel", "org_id")
+DOMAIN       = cfg.get("zitadel", "domain", fallback="").rstrip("/")
+ORG_ID       = cfg.get("zitadel", "org_id", fallback="")
 #
 # USERNAME    = cfg.get("new_user", "username",    fallback="newadmin123")
 # GIVEN_NAME  = cfg.get("new_user", "given_name",  fallback="Admin12334")
@@ -21,42 +22,32 @@ FAMILY_NAME = "User"
 EMAIL       = "admin12366fdf@example.com"
 PASSWORD    = "SecretPass123!"
 ORG_ROLES   = ["ORG_OWNER"]
-H = {
-    "Authorization": f"Bearer {ACCESS_TOKEN}",
-    "x-zitadel-orgid": ORG_ID,
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-}
 
-def create_user_v2_human():
+def create_user_v2_human(client):
     """Create a human user via v2 /users/human (works on your setup)."""
-    url = f"{DOMAIN}/v2/users/human"
     payload = {
         "userName": USERNAME,
         "profile": {"givenName": GIVEN_NAME, "familyName": FAMILY_NAME},
         "email":   {"email": EMAIL, "isVerified": True},
         "password": {"password": PASSWORD, "changeRequired": False},
     }
-    r = requests.post(url, headers=H, json=payload, timeout=30)
-    r.raise_for_status()
-    j = r.json()
+    j = client.post("/v2/users/human", payload)
     user_id = j.get("userId") or j.get("id") or j.get("user", {}).get("id")
     if not user_id:
         raise RuntimeError(f"Could not parse userId from response: {j}")
     return user_id
 
-def add_org_member(user_id: str):
+def add_org_member(client, user_id: str):
     """Grant roles to the user on the org (v1 members)."""
-    url = f"{DOMAIN}/management/v1/orgs/me/members"
-    r = requests.post(url, headers=H, json={"userId": user_id, "roles": ORG_ROLES}, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    return client.post("/management/v1/orgs/me/members", {"userId": user_id, "roles": ORG_ROLES})
 
 def main():
-    if not all([DOMAIN, ACCESS_TOKEN, ORG_ID]):
-        sys.exit("Set domain, access_token, org_id in zitadel.conf")
-    uid = create_user_v2_human()
-    add_org_member(uid)
+    if not all([DOMAIN, ORG_ID]):
+        sys.exit("Set domain, org_id and access_token (or client_id/client_secret) in zitadel.conf")
+    # access_token or client credentials / key file, whichever zitadel.conf has
+    client = ZitadelClient.from_config("zitadel.conf")
+    uid = create_user_v2_human(client)
+    add_org_member(client, uid)
     print(json.dumps({
         "userId": uid,
         "username": USERNAME,
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Stand up an environment (projects, OIDC / API apps, service users, their
+secrets and org members) from one declarative spec.
+
+    ./env_bootstrap.py env.json --dry-run      # what exists, what would be created
+    ./env_bootstrap.py env.json                # create what is missing
+    ./env_bootstrap.py env.json --rotate-secrets
+
+The spec (JSON, org from zitadel.conf unless "org_id" is given):
+
+    {
+      "projects": {
+        "P9": {"apps": {
+          "p9-backend": {"type": "api"},
+          "p9-web": {"type": "oidc", "redirect_uris": ["https://app53dev.int.capoptix.com/auth/callback"],
+                     "post_logout_uris": ["https://app53dev.int.capoptix.com/"]}
+        }}
+      },
+      "service_users": {
+        "p9-service-dev-a": {"name": "P9 service (dev a)", "roles": ["ORG_USER_MANAGER"]}
+      },
+      "members": {"admin@example.com": ["ORG_OWNER"]}
+    }
+
+The spec becomes a graph of steps: project -> app -> app secret, and
+service user -> membership -> user secret. A step starts as soon as the
+steps it depends on are done, so independent branches (other projects,
+other users) run concurrently on --workers threads; a failed step skips
+only what depends on it.
+
+Every step looks up the existing resource first (by project, app or user
+name; members by their current roles) and only creates or updates what
+is missing, so a re-run is cheap and changes nothing. Secrets are made
+for resources created in this run (apps: the one returned on creation);
+existing ones keep theirs unless --rotate-secrets is given. Secrets go to
+the [sink:*] sections of zitadel.conf (default: a CSV sink at --output)
+and are recorded in the ledger. Set "secret": false on an app or user to
+skip its secret.
+"""
+import argparse
+import collections
+import configparser
+import json
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from org_member_sync import MEMBERS, resolve_user_id
+from rotation_ledger import ledger_from_config
+from secret_sinks import CsvSink, Delivery, secret_event, sinks_from_config
+from zitadel_client import ZitadelClient
+from zitadel_inventory import SearchFilter, extract, list_apps, list_service_users, pick_client_id_from_app
+from zitadel_preflight import PreflightError, require
+from zitadel_profile import phase, profile_main
+from zitadel_rotation import rotate_app_secret, rotate_service_user_secret
+
+WORKERS = 8
+OUTPUT_CSV = "bootstrap_secrets.csv"
+PROJECTS = "/management/v1/projects"
+OIDC_DEFAULTS = {
+    "responseTypes": ["OIDC_RESPONSE_TYPE_CODE"],
+    "grantTypes": ["OIDC_GRANT_TYPE_AUTHORIZATION_CODE", "OIDC_GRANT_TYPE_REFRESH_TOKEN"],
+    "appType": "OIDC_APP_TYPE_WEB",
+    "authMethodType": "OIDC_AUTH_METHOD_TYPE_BASIC",
+}
+
+
+# ----------------- dependency graph -----------------
+Step = collections.namedtuple("Step", "fn deps")
+
+
+class DependencyFailed(RuntimeError):
+    pass
+
+
+def run_graph(steps, workers=WORKERS):
+    """
+    Run {key: Step}: ``fn(results)`` starts once every key in ``deps`` has
+    finished and can read their results. Steps whose dependencies failed
+    get a DependencyFailed instead of running. Returns {key: result or
+    exception}.
+    """
+    dependents = collections.defaultdict(list)
+    waiting = {}
+    for key, step in steps.items():
+        for dep in step.deps:
+            if dep not in steps:
+                raise ValueError(f"step {key} depends on unknown step {dep}")
+            dependents[dep].append(key)
+        waiting[key] = set(step.deps)
+    results, running = {}, {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def ready(key):
+            failed = [d for d in steps[key].deps if isinstance(results[d], Exception)]
+            if failed:
+                finish(key, DependencyFailed(f"{failed[0]} failed"))
+            else:
+                running[pool.submit(steps[key].fn, results)] = key
+
+        def finish(key, result):
+            results[key] = result
+            for child in dependents[key]:
+                waiting[child].discard(key)
+                if not waiting[child]:
+                    ready(child)
+
+        for key in [k for k, deps in waiting.items() if not deps]:
+            ready(key)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                key = running.pop(fut)
+                try:
+                    finish(key, fut.result())
+                except Exception as e:
+                    finish(key, e)
+    stuck = [k for k in steps if k not in results]
+    if stuck:
+        raise ValueError(f"dependency cycle between {', '.join(stuck)}")
+    return results
+
+
+# ----------------- steps -----------------
+def load_spec(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _created_id(data, *keys):
+    return extract(data, *keys) or extract(data, ["details", "id"])
+
+
+class Bootstrap:
+    """The steps of one spec; each returns {"id", "action"} (action: exists / created / ...)."""
+
+    def __init__(self, client, spec, dry_run=False, rotate=False, delivery=None, ledger=None):
+        self.client = client
+        self.spec = spec
+        self.dry_run = dry_run
+        self.rotate = rotate
+        self.delivery = delivery
+        self.ledger = ledger
+        self.org_id = spec.get("org_id") or client.org_id
+        self._fresh = {}  # app step -> secret returned when the app was created
+        self._lock = threading.Lock()
+
+    def steps(self):
+        steps = {}
+        for project, pspec in (self.spec.get("projects") or {}).items():
+            pkey = f"project:{project}"
+            steps[pkey] = Step(lambda res, p=project: self.project(p), ())
+            for app, aspec in ((pspec or {}).get("apps") or {}).items():
+                akey = f"app:{project}/{app}"
+                steps[akey] = Step(lambda res, a=app, s=aspec, k=akey, pk=pkey: self.app(res[pk], a, s or {}, k),
+                                   (pkey,))
+                if self._wants_secret(aspec or {}):
+                    steps[f"secret:{project}/{app}"] = Step(
+                        lambda res, a=app, k=akey, pk=pkey: self.app_secret(res[pk], res[k], a, k), (akey,))
+
+        # a service user listed in "members" too gets the roles of both entries
+        members = dict(self.spec.get("members") or {})
+        for username, uspec in (self.spec.get("service_users") or {}).items():
+            uspec = uspec or {}
+            ukey = f"user:{username}"
+            steps[ukey] = Step(lambda res, u=username, s=uspec: self.service_user(u, s), ())
+            last = ukey
+            roles = sorted(set(uspec.get("roles") or ()) | set(members.pop(username, None) or ()))
+            if roles:
+                last = f"member:{username}"
+                steps[last] = Step(lambda res, r=roles, k=ukey: self.member(res[k], r), (ukey,))
+            if uspec.get("secret", True):
+                steps[f"secret:{username}"] = Step(lambda res, u=username, k=ukey: self.user_secret(res[k], u),
+                                                   (last,))
+
+        for login, roles in members.items():
+            steps[f"member:{login}"] = Step(lambda res, l=login, r=roles: self.member({"id": None, "login": l}, r), ())
+        return steps
+
+    @staticmethod
+    def _wants_secret(aspec):
+        if "secret" in aspec:
+            return bool(aspec["secret"])
+        return aspec.get("auth_method", "BASIC").upper() not in ("NONE", "PRIVATE_KEY_JWT")
+
+    def _would_create(self, action, parent):
+        """Dry run below a resource that does not exist yet: nothing to look up."""
+        return self.dry_run and parent.get("id") is None and {"id": None, "action": action}
+
+    # ----- projects and apps -----
+    def project(self, name):
+        # the name filter narrows the search; the exact match guards against one the server ignored
+        projects = self.client.search(f"{PROJECTS}/_search", SearchFilter(project_name=name).project_queries(),
+                                      result_keys=("result", "projects"), org_id=self.org_id)
+        found = next((p for p in projects if p.get("name") == name), None)
+        if found:
+            return {"id": found.get("id"), "action": "exists"}
+        if self.dry_run:
+            return {"id": None, "action": "would create"}
+        return {"id": _created_id(self.client.post(PROJECTS, {"name": name}, org_id=self.org_id), "id"),
+                "action": "created"}
+
+    def app(self, project, name, aspec, key):
+        skip = self._would_create("would create", project)
+        if skip:
+            return skip
+        found = next((a for a in list_apps(self.client, project["id"], org_id=self.org_id, memo=True)
+                      if a.get("name") == name), None)
+        if found:
+            return {"id": found.get("id"), "action": "exists", "app": found}
+        if self.dry_run:
+            return {"id": None, "action": "would create"}
+        kind = (aspec.get("type") or "oidc").lower()
+        if kind == "api":
+            payload = {"name": name,
+                       "authMethodType": f"API_AUTH_METHOD_TYPE_{aspec.get('auth_method', 'BASIC').upper()}"}
+            app = {"name": name, "apiConfig": {}}
+        else:
+            payload = {**OIDC_DEFAULTS, "name": name,
+                       "redirectUris": aspec.get("redirect_uris") or [],
+                       "postLogoutRedirectUris": aspec.get("post_logout_uris") or []}
+            if "auth_method" in aspec:
+                payload["authMethodType"] = f"OIDC_AUTH_METHOD_TYPE_{aspec['auth_method'].upper()}"
+            app = {"name": name, "oidcConfig": {}}
+        data = self.client.post(f"{PROJECTS}/{project['id']}/apps/{kind}", payload, org_id=self.org_id)
+        app["id"] = _created_id(data, "appId", "id")
+        app["clientId"] = data.get("clientId") or ""
+        if data.get("clientSecret"):
+            with self._lock:
+                self._fresh[key] = data["clientSecret"]
+        return {"id": app["id"], "action": "created", "app": app}
+
+    def app_secret(self, project, app, name, key):
+        with self._lock:
+            secret = self._fresh.pop(key, None)
+        if app["action"] != "created" and not self.rotate:
+            return {"id": app["id"], "action": "kept" if app["id"] else "would create"}
+        if self.dry_run:
+            return {"id": app["id"], "action": "would rotate"}
+        a = app["app"]
+        event = secret_event("APP", a["id"], "", pick_client_id_from_app(a), name, self.org_id, project["id"])
+        return self._deliver(event, lambda: secret or rotate_app_secret(self.client, project["id"], a, self.org_id))
+
+    # ----- service users and members -----
+    def service_user(self, username, uspec):
+        query = {"userNameQuery": {"userName": username, "method": "TEXT_QUERY_METHOD_EQUALS"}}
+        found = next(iter(list_service_users(self.client, self.org_id, extra_queries=[query])), None)
+        if found:
+            return {"id": found.get("userId") or found.get("id"), "action": "exists", "login": username}
+        if self.dry_run:
+            return {"id": None, "action": "would create", "login": username}
+        data = self.client.post("/management/v1/users/machine", {
+            "userName": username,
+            "name": uspec.get("name") or username,
+            "description": uspec.get("description") or "",
+            "accessTokenType": f"ACCESS_TOKEN_TYPE_{uspec.get('access_token_type', 'BEARER').upper()}",
+        }, org_id=self.org_id)
+        return {"id": _created_id(data, "userId", "id"), "action": "created", "login": username}
+
+    def member(self, user, roles):
+        skip = self._would_create("would add", user) if user.get("action") else None
+        if skip:
+            return skip
+        user_id = user.get("id") or resolve_user_id(self.client, user["login"])
+        if not user_id:
+            raise LookupError(f"no such user: {user['login']}")
+        # one members/_search shared by every member step of the run
+        members = self.client.search(f"{MEMBERS}/_search", result_keys=("result",), org_id=self.org_id, memo=True)
+        current = next((frozenset(m.get("roles") or ()) for m in members if m.get("userId") == user_id), None)
+        roles = sorted(roles)
+        if current == frozenset(roles):
+            return {"id": user_id, "action": "exists"}
+        action = "added" if current is None else "updated"
+        if self.dry_run:
+            return {"id": user_id, "action": f"would be {action}"}
+        if current is None:
+            self.client.post(MEMBERS, {"userId": user_id, "roles": roles}, org_id=self.org_id)
+        else:
+            self.client.put(f"{MEMBERS}/{user_id}", {"roles": roles}, org_id=self.org_id)
+        return {"id": user_id, "action": action}
+
+    def user_secret(self, user, username):
+        if user["action"] != "created" and not self.rotate:
+            return {"id": user["id"], "action": "kept" if user["id"] else "would create"}
+        if self.dry_run:
+            return {"id": user["id"], "action": "would rotate"}
+        event = secret_event("SERVICE_USER", user["id"], "", username, username, self.org_id)
+        return self._deliver(event, lambda: rotate_service_user_secret(self.client, user["id"], owner=self.org_id))
+
+    def _deliver(self, event, make_secret):
+        try:
+            event["secret"] = make_secret()
+        except Exception as e:
+            self.ledger.record(self.client.domain, event, f"ERROR: {e}")
+            raise
+        self.ledger.record(self.client.domain, event, "ok" if event["secret"] else "no secret in response")
+        self.delivery.publish(event)
+        return {"id": event["resource_id"], "action": "secret delivered"}
+
+
+def preflight_checks(spec, rotate):
+    users = spec.get("service_users") or {}
+    checks = ["project_search"] if spec.get("projects") else []
+    if rotate or spec.get("projects"):
+        checks.append("app_secret")
+    if users:
+        checks.append("user_secret")
+    if spec.get("members") or any((u or {}).get("roles") for u in users.values()):
+        checks.append("member_write")
+    return checks
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Create the projects, apps, service users, secrets and members "
+                                             "of an environment spec (idempotent).")
+    ap.add_argument("spec", help="environment spec (JSON)")
+    ap.add_argument("--config", default="zitadel.conf")
+    ap.add_argument("--output", default=OUTPUT_CSV, help="CSV sink used when zitadel.conf has no [sink:*]")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--rotate-secrets", action="store_true", help="also make new secrets for existing resources")
+    ap.add_argument("--dry-run", action="store_true", help="look up what exists, change nothing")
+    args = ap.parse_args()
+
+    cfg = configparser.ConfigParser()
+    cfg.read(args.config)
+    client = ZitadelClient.from_config(args.config)
+    spec = load_spec(args.spec)
+    delivery = ledger = None
+    if not args.dry_run:
+        require(client, *preflight_checks(spec, args.rotate_secrets))
+        ledger = ledger_from_config(cfg)
+        delivery = Delivery(sinks_from_config(cfg) or [CsvSink(args.output)])
+
+    boot = Bootstrap(client, spec, args.dry_run, args.rotate_secrets, delivery, ledger)
+    steps = boot.steps()
+    with phase("bootstrap"):
+        results = run_graph(steps, args.workers)
+    if delivery:
+        delivery.close()
+
+    failed = skipped = 0
+    for key in steps:
+        result = results[key]
+        if isinstance(result, DependencyFailed):
+            skipped += 1
+            print(f"# {key} skipped: {result}", file=sys.stderr)
+        elif isinstance(result, Exception):
+            failed += 1
+            print(f"# {key} failed: {getattr(getattr(result, 'response', None), 'text', None) or result}",
+                  file=sys.stderr)
+        else:
+            print(f"{result['action']},{key},{result.get('id') or ''}")
+    changed = sum(1 for r in results.values() if isinstance(r, dict) and r["action"] not in ("exists", "kept"))
+    print(f"# {len(steps)} steps: {changed} changes{' (dry run)' if args.dry_run else ''}, "
+          f"{failed} failed, {skipped} skipped", file=sys.stderr)
+    if failed or skipped or (delivery and delivery.failures):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        profile_main(main)
+    except PreflightError as e:
+        print(e, file=sys.stderr)
+        sys.exit(4)
+    except requests.HTTPError as e:
+        print("HTTP error:", getattr(e.response, "text", str(e)), file=sys.stderr)
+        sys.exit(2)
+    except Exception as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(3)
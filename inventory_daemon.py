@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Long-running inventory daemon.
+
+Keeps the project / app / service-user inventory warm in memory, re-crawls
+it in the background every --refresh seconds and answers lookups and
+rotation requests over a local Unix socket (--socket) or 127.0.0.1:--port.
+With --events the periodic crawl is replaced by a small read of the event
+feed every --event-interval seconds (see zitadel_events.py); POST /refresh
+still forces a full crawl.
+
+    GET  /health
+    GET  /apps/<app_id>/project          -> {"project_id": ...}
+    GET  /clients/<client_id>            -> {"scope", "project_id", "org_id", "resource"}
+    GET  /users/<user_id or username>
+    GET  /hosts                          -> {"hosts": {host: number of apps}}
+    GET  /hosts/<host or prefix*>        -> {"hosts": {host: [app, ...]}}
+    GET  /uris?prefix=<uri prefix>       -> {"uris": [{uri, kind, app...}]}
+    POST /rotate   {"client_id": ...}    -> {"scope", "resource_id", "secret"}
+    POST /refresh
+
+Scripts find the daemon through ZITADEL_DAEMON ("unix:/path/to.sock" or
+"http://127.0.0.1:8765") and fall back to crawling when it is not set or
+not reachable (see query_daemon()).
+
+/rotate hands out secrets, so on the TCP port it needs a shared token:
+
+    [daemon]
+    token = <long random string>      ; or ZITADEL_DAEMON_TOKEN
+
+sent as "Authorization: Bearer <token>". Without a token it is refused on
+TCP and only served on the 0600 Unix socket.
+"""
+import argparse
+import configparser
+import hmac
+import http.client
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from rotation_ledger import ledger_from_config
+from secret_sinks import secret_event
+from zitadel_client import DEFAULT_ORG, ZitadelClient
+from zitadel_events import POLL_INTERVAL, STATE_FILE, EventFollower, head
+from zitadel_inventory import crawl, crawl_all_orgs, extract, service_user_fields
+from zitadel_rotation import resource_owner, rotate_app_secret, rotate_service_user_secret
+
+REFRESH_INTERVAL = 300
+DAEMON_ADDRESS = os.environ.get("ZITADEL_DAEMON", "")
+DAEMON_TIMEOUT = 5
+DAEMON_TOKEN = os.environ.get("ZITADEL_DAEMON_TOKEN", "")
+
+
+class InventoryStore:
+    """Holds the current Inventory and swaps in a fresh one after each crawl."""
+
+    def __init__(self, client, refresh_interval=REFRESH_INTERVAL, all_orgs=False, ledger=None,
+                 events=None, event_interval=POLL_INTERVAL):
+        self.client = client
+        self.ledger = ledger
+        self.refresh_interval = refresh_interval
+        self.all_orgs = all_orgs
+        self.events = events  # event state file: follow the event feed between crawls
+        self.event_interval = event_interval
+        self.follower = None
+        self.inventory = None
+        self.last_error = None
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def refresh(self):
+        with self._refresh_lock:
+            self.client.memo.clear()  # memoized reads are per refresh cycle
+            try:
+                start = head(self.client) if self.events else None
+                inv = crawl_all_orgs(self.client) if self.all_orgs else crawl(self.client)
+                if self.events:
+                    follower = EventFollower(self.client, inv, self.events)
+                    follower.position = start  # the crawl covers everything up to here
+                    follower.save()
+                    self.follower = follower
+                self.inventory = inv
+                self.last_error = None
+            except Exception as e:
+                # keep serving the previous inventory
+                self.last_error = str(e)
+                print(f"# refresh failed: {e}", file=sys.stderr)
+
+    def request_refresh(self):
+        self._wake.set()
+
+    def poll_events(self):
+        # handlers read self.inventory without a lock: the follower never
+        # changes an inventory in place, it hands back a new one
+        with self._refresh_lock:
+            try:
+                if self.follower.poll():
+                    self.inventory = self.follower.inventory  # a changed copy, swapped in whole
+                    print(f"# events applied up to {self.follower.position['since']}: {self.inventory.stats()}",
+                          file=sys.stderr)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"# event poll failed: {e}", file=sys.stderr)
+
+    def run_refresher(self):
+        while True:
+            if self.follower is None:
+                self._wake.wait(self.refresh_interval)
+                self._wake.clear()
+                self.refresh()
+            elif self._wake.wait(self.event_interval):
+                self._wake.clear()
+                self.refresh()  # POST /refresh still forces a full crawl
+            else:
+                self.poll_events()
+
+    def rotate(self, client_id):
+        inv = self.inventory
+        hit = inv.find_client(client_id) if inv else None
+        if not hit:
+            raise LookupError(f"client_id '{client_id}' not found in inventory")
+        scope, project_id, resource = hit
+        if scope == "APP":
+            resource_id = resource.get("id")
+            org_id = inv.org_for_app(resource_id)
+            event = secret_event(scope, resource_id, "", client_id, resource.get("name"), org_id, project_id)
+            rotate = lambda: rotate_app_secret(self.client, project_id, resource, org_id or DEFAULT_ORG)
+        else:
+            resource_id = extract(resource, "userId", "id")
+            owner = resource_owner(resource)
+            event = secret_event(scope, resource_id, "", client_id, service_user_fields(resource)[2], owner)
+            rotate = lambda: rotate_service_user_secret(self.client, resource_id, owner=owner)
+        try:
+            event["secret"] = rotate()
+        except Exception as e:
+            if self.ledger:
+                self.ledger.record(self.client.domain, event, f"ERROR: {e}")
+            raise
+        if self.ledger:
+            self.ledger.record(self.client.domain, event, "ok" if event["secret"] else "no secret in response")
+        return scope, resource_id, event["secret"]
+
+
+class Handler(BaseHTTPRequestHandler):
+    store = None  # set by serve()
+    token = ""    # shared secret for /rotate over TCP, set by serve()
+
+    def log_message(self, fmt, *args):
+        # client_address is "" on Unix sockets, so don't use address_string()
+        print("# " + (fmt % args), file=sys.stderr)
+
+    def _send(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}")
+
+    def do_GET(self):
+        inv = self.store.inventory
+        url = urlsplit(self.path)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        if parts == ["health"]:
+            return self._send(200, {"ready": inv is not None, "last_error": self.store.last_error,
+                                    **(inv.stats() if inv else {})})
+        if inv is None:
+            return self._send(503, {"error": "inventory not loaded yet"})
+        if len(parts) == 3 and parts[0] == "apps" and parts[2] == "project":
+            pid = inv.find_project_for_app(parts[1])
+            return self._send(200, {"project_id": pid}) if pid else self._send(404, {"error": "app not found"})
+        if len(parts) == 2 and parts[0] == "clients":
+            hit = inv.find_client(parts[1])
+            if not hit:
+                return self._send(404, {"error": "client_id not found"})
+            scope, pid, resource = hit
+            org_id = inv.org_for_app(resource.get("id")) if scope == "APP" else resource_owner(resource)
+            return self._send(200, {"scope": scope, "project_id": pid, "org_id": org_id or "", "resource": resource})
+        if len(parts) == 2 and parts[0] == "users":
+            user = inv.find_user(parts[1])
+            return self._send(200, user) if user else self._send(404, {"error": "user not found"})
+        if parts == ["hosts"]:
+            return self._send(200, {"hosts": {h: len(apps) for h, apps in sorted(inv.hosts.items())}})
+        if len(parts) == 2 and parts[0] == "hosts":
+            hits = inv.apps_for_host(parts[1])
+            return self._send(200 if hits else 404,
+                              {"hosts": {h: [inv.app_ref(a) for a in apps] for h, apps in hits.items()}})
+        if parts == ["uris"]:
+            prefix = (parse_qs(url.query).get("prefix") or [""])[0]
+            return self._send(200, {"uris": [{"uri": uri, "kind": kind, **inv.app_ref(app_id)}
+                                             for uri, app_id, kind in inv.apps_for_uri_prefix(prefix)]})
+        self._send(404, {"error": "unknown endpoint"})
+
+    def _may_rotate(self):
+        if isinstance(self.server, UnixHTTPServer):
+            return True  # 0600 socket: only the daemon's own user can connect
+        if not self.token:
+            return False
+        sent = self.headers.get("Authorization") or ""
+        return hmac.compare_digest(sent.encode(), f"Bearer {self.token}".encode())
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/refresh":
+            self.store.request_refresh()
+            return self._send(202, {"refresh": "scheduled"})
+        if path == "/rotate":
+            if not self._may_rotate():
+                return self._send(403, {"error": "rotation over TCP needs the [daemon] token "
+                                                 "(Authorization: Bearer ...) or the Unix socket"})
+            client_id = str(self._body().get("client_id") or "")
+            try:
+                scope, resource_id, secret = self.store.rotate(client_id)
+            except LookupError as e:
+                return self._send(404, {"error": str(e)})
+            except Exception as e:
+                return self._send(502, {"error": str(e)})
+            return self._send(200, {"scope": scope, "resource_id": resource_id, "secret": secret})
+        self._send(404, {"error": "unknown endpoint"})
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        os.chmod(self.server_address, 0o600)
+
+
+def serve(store, socket_path=None, port=8765, token=""):
+    Handler.store = store
+    Handler.token = token
+    if socket_path:
+        server = UnixHTTPServer(socket_path, Handler)
+        print(f"# serving on unix:{socket_path}", file=sys.stderr)
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        print(f"# serving on http://127.0.0.1:{port}"
+              f"{'' if token else ' (/rotate disabled: no [daemon] token)'}", file=sys.stderr)
+    server.serve_forever()
+
+
+# ----------------- client side (used by the scripts) -----------------
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+def query_daemon(method, path, payload=None, address=DAEMON_ADDRESS, timeout=DAEMON_TIMEOUT, token=DAEMON_TOKEN):
+    """
+    Ask the daemon; returns (status, json) or None when no daemon is
+    configured or it cannot be reached, so callers can fall back to crawling.
+    """
+    if not address:
+        return None
+    try:
+        if address.startswith("unix:"):
+            conn = _UnixConnection(address[len("unix:"):], timeout)
+        else:
+            host = address.split("://", 1)[-1].rstrip("/")
+            conn = http.client.HTTPConnection(host, timeout=timeout)
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        conn.request(method, path, body=body, headers=headers)
+        r = conn.getresponse()
+        data = json.loads(r.read() or b"{}")
+        conn.close()
+    except (OSError, ValueError):
+        return None
+    if r.status == 503:
+        return None
+    return r.status, data
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve a warm Zitadel inventory over a local socket.")
+    ap.add_argument("--config", default="zitadel.conf")
+    ap.add_argument("--socket", help="Unix socket path (default: TCP on 127.0.0.1)")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--refresh", type=int, default=REFRESH_INTERVAL, help="seconds between background crawls")
+    ap.add_argument("--all-orgs", action="store_true", help="crawl every org visible to the token")
+    ap.add_argument("--events", action="store_true",
+                    help="after the first crawl, follow the event feed instead of re-crawling")
+    ap.add_argument("--event-interval", type=int, default=POLL_INTERVAL, help="seconds between event polls")
+    ap.add_argument("--event-state", default=STATE_FILE)
+    args = ap.parse_args()
+
+    cfg = configparser.ConfigParser()
+    cfg.read(args.config)
+    store = InventoryStore(ZitadelClient.from_config(args.config), args.refresh, args.all_orgs,
+                           ledger_from_config(cfg), args.event_state if args.events else None, args.event_interval)
+    started = time.time()
+    store.refresh()
+    if store.inventory is None:
+        sys.exit(f"Initial crawl failed: {store.last_error}")
+    print(f"# inventory loaded in {time.time() - started:.1f}s: {store.inventory.stats()}", file=sys.stderr)
+    threading.Thread(target=store.run_refresher, daemon=True).start()
+    serve(store, args.socket, args.port, cfg.get("daemon", "token", fallback=DAEMON_TOKEN))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
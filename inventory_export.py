@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Export the project / app / service-user inventory as CSV or JSON.
+
+    ./inventory_export.py                      # the org from zitadel.conf
+    ./inventory_export.py --all-orgs -o all.csv
+    ./inventory_export.py --format json
+    ./inventory_export.py --project 'p9-*' --app-type OIDC
+    ./inventory_export.py --username 'p9-service-*' --user-state active
+
+--all-orgs lists the orgs visible to the token once and crawls all of them
+concurrently (each request with that org's x-zitadel-orgid), producing one
+merged inventory for instance-wide audits.
+
+Filters are sent to Zitadel as search queries where the API has one
+(project/app name, username, user state, org), so a targeted run only
+downloads matching records; app type and complex patterns are applied
+locally. App-only filters skip the service-user listing and vice versa.
+
+--deadline 10m bounds the run: listings that have not started when the
+budget runs out are skipped and the rows collected so far are written
+anyway, but to <output>.partial so nothing reading <output> mistakes them
+for a full export (a JSON export also says "complete": false). A resume
+point is written next to it (<output>.resume.json), and --resume <that
+file> lists only the skipped parts, merges them with the partial rows and
+writes <output> once nothing is left. Partial runs exit with status 5.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+import requests
+
+from zitadel_client import ZitadelClient
+from zitadel_deadline import PARTIAL_EXIT, Deadline, add_deadline_arg
+from zitadel_inventory import (SearchFilter, add_filter_args, app_type_label, crawl, crawl_all_orgs, extract,
+                               pick_client_id_from_app, service_user_fields)
+from zitadel_profile import phase, profile_main
+
+FIELDNAMES = ["scope", "org_id", "project_id", "project_name", "resource_id", "name", "type", "client_id",
+              "state", "change_date"]
+
+
+def inventory_rows(inv):
+    for app_id, app in inv.apps.items():
+        pid = inv.find_project_for_app(app_id)
+        yield {
+            "scope": "APP",
+            "org_id": inv.org_for_app(app_id),
+            "project_id": pid,
+            "project_name": (inv.projects.get(pid) or {}).get("name") or "",
+            "resource_id": app_id,
+            "name": app.get("name") or "",
+            "type": app_type_label(app),
+            "client_id": str(pick_client_id_from_app(app) or ""),
+            "state": app.get("state") or "",
+            "change_date": extract(app, ["details", "changeDate"]) or "",
+        }
+    for user_id, u in inv.users.items():
+        _, _, display, client_id = service_user_fields(u)
+        yield {
+            "scope": "SERVICE_USER",
+            "org_id": inv.org_for_user(user_id),
+            "project_id": "",
+            "project_name": "",
+            "resource_id": user_id,
+            "name": display,
+            "type": "SERVICE_USER",
+            "client_id": client_id,
+            "state": u.get("state") or "",
+            "change_date": extract(u, ["details", "changeDate"]) or "",
+        }
+
+
+def read_rows(path, fmt):
+    """Rows of a previous (partial) export."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            return list(csv.DictReader(f))
+        return json.load(f).get("rows") or []
+
+
+def write_output(path, fmt, rows, stats, pending):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            w = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            w.writeheader()
+            w.writerows(rows)
+        else:
+            doc = {"stats": stats, "complete": not any(pending.values()), "rows": rows}
+            if not doc["complete"]:
+                doc["resume"] = pending
+            json.dump(doc, f, indent=1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export the Zitadel inventory.")
+    ap.add_argument("--config", default="zitadel.conf")
+    ap.add_argument("--all-orgs", action="store_true", help="crawl every org visible to the token")
+    ap.add_argument("--format", choices=("csv", "json"), default="csv")
+    ap.add_argument("-o", "--output", default="zitadel_inventory.csv")
+    add_filter_args(ap)
+    add_deadline_arg(ap)
+    ap.add_argument("--resume", metavar="RESUME_JSON", help="finish a partial export from its resume point")
+    args = ap.parse_args()
+
+    client = ZitadelClient.from_config(args.config)
+    filters = SearchFilter.from_args(args)
+    resume, previous = None, []
+    if args.resume:
+        with open(args.resume, encoding="utf-8") as f:
+            state = json.load(f)
+        args.output, args.format, resume = state["output"], state["format"], state["pending"]
+        previous = read_rows(state.get("partial") or args.output, args.format)
+    deadline = Deadline(args.deadline)
+    # keep ~10% of the budget for writing the output
+    client.deadline = crawl_deadline = deadline.share(0.9)
+    if args.all_orgs:
+        inv = crawl_all_orgs(client, filters=filters, deadline=crawl_deadline, resume=resume)
+    else:
+        inv = crawl(client, filters=filters, deadline=crawl_deadline, resume=resume)
+    client.deadline = None
+
+    seen = {(r["scope"], r["resource_id"]) for r in previous}
+    rows = previous + [r for r in inventory_rows(inv) if (r["scope"], r["resource_id"]) not in seen]
+    resume_path, partial_path = f"{args.output}.resume.json", f"{args.output}.partial"
+    with phase("csv writing" if args.format == "csv" else "json writing"):
+        write_output(args.output if inv.complete else partial_path, args.format, rows, inv.stats(), inv.pending)
+
+    if inv.complete:
+        for path in (resume_path, partial_path):
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"Wrote {len(rows)} rows ({inv.stats()}) to {args.output}", file=sys.stderr)
+        return
+    with open(resume_path, "w", encoding="utf-8") as f:
+        json.dump({"output": args.output, "partial": partial_path, "format": args.format, "pending": inv.pending},
+                  f, indent=1)
+    left = {k: len(v) for k, v in inv.pending.items() if v}
+    print(f"# deadline reached: wrote a PARTIAL export of {len(rows)} rows to {partial_path}; "
+          f"not listed: {left}. Resume with --resume {resume_path}", file=sys.stderr)
+    sys.exit(PARTIAL_EXIT)
+
+
+if __name__ == "__main__":
+    try:
+        profile_main(main)
+    except requests.HTTPError as e:
+        print("HTTP error:", getattr(e.response, "text", str(e)), file=sys.stderr)
+        sys.exit(2)
+    except Exception as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(3)
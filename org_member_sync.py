@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Reconcile org memberships (/management/v1/orgs/me/members) with a desired
+user -> roles mapping.
+
+The current members are read once (one paginated members/_search); the
+add / update / remove diff is computed locally and only the changes are
+sent, concurrently. A sync with nothing to change costs that one read when
+the mapping names users by userId or by a login the members listing
+carries (preferredLoginName, email); any other login names are resolved
+together, in one batched user search.
+
+    ./org_member_sync.py members.csv              # user,roles  (roles space separated)
+    ./org_member_sync.py members.json --dry-run   # {"user": ["ORG_OWNER", ...]}
+    ./org_member_sync.py members.csv --prune      # also drop members not in the file
+
+"user" is a userId or a login name. A row with no roles removes that
+member; members missing from the file are only removed with --prune.
+"""
+import argparse
+import csv
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from zitadel_client import ZitadelClient
+from zitadel_inventory import RESOLVE_BATCH
+from zitadel_preflight import require
+from zitadel_profile import phase, profile_main
+
+MEMBERS = "/management/v1/orgs/me/members"
+WORKERS = 8
+
+
+def load_desired(path):
+    """{user: frozenset(roles)} from a user,roles CSV or a JSON object."""
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            return {str(k): frozenset(v) for k, v in json.load(f).items()}
+    desired = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            user = (row.get("user") or row.get("user_id") or row.get("username") or "").strip()
+            if user:
+                desired[user] = frozenset((row.get("roles") or "").replace(";", " ").split())
+    return desired
+
+
+def list_members(client):
+    return list(client.search(f"{MEMBERS}/_search", result_keys=("result",)))
+
+
+def resolve_user_ids(client, logins, batch=RESOLVE_BATCH):
+    """
+    {login name or userId: userId} for users the members listing did not
+    name: one v2 search per ``batch`` logins. Unknown logins are missing.
+    """
+    logins = list(dict.fromkeys(logins))
+    found = {}
+    for i in range(0, len(logins), batch):
+        chunk = logins[i:i + batch]
+        match = {"orQuery": {"queries": [
+            {"inUserIdsQuery": {"userIds": chunk}},
+            *({"userNameQuery": {"userName": login, "method": "TEXT_QUERY_METHOD_EQUALS"}} for login in chunk),
+            *({"loginNameQuery": {"loginName": login, "method": "TEXT_QUERY_METHOD_EQUALS"}} for login in chunk),
+        ]}}
+        for u in client.search("/v2/users", [match], result_keys=("result", "users"), v2=True, org_id=None):
+            user_id = u.get("userId") or u.get("id")
+            names = (user_id, u.get("username"), u.get("userName"), u.get("preferredLoginName"),
+                     *(u.get("loginNames") or ()))
+            for login in chunk:
+                if login in names:
+                    found[login] = user_id
+    return found
+
+
+def resolve_user_id(client, login):
+    """userId for a login name that is not a member yet (one filtered v2 search)."""
+    return resolve_user_ids(client, [login]).get(login)
+
+
+def plan(client, desired, members, prune=False):
+    """[(action, user_id, roles)] with action in add / update / remove."""
+    current, by_login = {}, {}
+    for m in members:
+        current[m["userId"]] = frozenset(m.get("roles") or ())
+        for key in ("preferredLoginName", "userName", "email"):
+            if m.get(key):
+                by_login[m[key]] = m["userId"]
+
+    # only logins that would be added need a lookup, and all of them share one search
+    unknown = [user for user, roles in desired.items() if roles and user not in current and user not in by_login]
+    if unknown:
+        by_login.update(resolve_user_ids(client, unknown))
+
+    changes, seen = [], set()
+    for user, roles in desired.items():
+        user_id = user if user in current else by_login.get(user)
+        if user_id is None:
+            if roles:
+                print(f"# skip {user}: no such user", file=sys.stderr)
+            continue  # no roles wanted and not a member: nothing to do
+        seen.add(user_id)
+        if user_id not in current:
+            if roles:
+                changes.append(("add", user_id, sorted(roles)))
+        elif not roles:
+            changes.append(("remove", user_id, []))
+        elif roles != current[user_id]:
+            changes.append(("update", user_id, sorted(roles)))
+    if prune:
+        changes += [("remove", uid, []) for uid in current if uid not in seen]
+    return changes
+
+
+def apply(client, change):
+    action, user_id, roles = change
+    if action == "add":
+        client.post(MEMBERS, {"userId": user_id, "roles": roles})
+    elif action == "update":
+        client.put(f"{MEMBERS}/{user_id}", {"roles": roles})
+    else:
+        client.delete(f"{MEMBERS}/{user_id}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sync org members and roles with a desired mapping.")
+    ap.add_argument("mapping", help="CSV (user,roles) or JSON ({user: [roles]})")
+    ap.add_argument("--config", default="zitadel.conf")
+    ap.add_argument("--prune", action="store_true", help="remove members that are not in the mapping")
+    ap.add_argument("--dry-run", action="store_true", help="print the diff, change nothing")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    args = ap.parse_args()
+
+    client = ZitadelClient.from_config(args.config)
+    desired = load_desired(args.mapping)
+    with phase("member listing"):
+        members = list_members(client)
+    with phase("diff"):
+        changes = plan(client, desired, members, args.prune)
+
+    for action, user_id, roles in changes:
+        print(f"{action},{user_id},{' '.join(roles)}")
+    if args.dry_run or not changes:
+        print(f"# {len(members)} members, {len(changes)} changes{' (dry run)' if args.dry_run else ''}",
+              file=sys.stderr)
+        return
+
+    # only now: a no-op sync stays at one read
+    require(client, "member_write")
+    failed = 0
+    with phase("apply"), ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(apply, client, c): c for c in changes}
+        for fut, (action, user_id, _) in futures.items():
+            try:
+                fut.result()
+            except requests.HTTPError as e:
+                failed += 1
+                print(f"# {action} {user_id} failed: {getattr(e.response, 'text', e)}", file=sys.stderr)
+    print(f"# {len(members)} members, {len(changes) - failed} changes applied, {failed} failed", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        profile_main(main)
+    except requests.HTTPError as e:
+        print("HTTP error:", getattr(e.response, "text", str(e)), file=sys.stderr)
+        sys.exit(2)
+    except Exception as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(3)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Which apps point at a redirect host or URI?
+
+    ./redirect_index.py host app53dev.int.capoptix.com     # apps with URIs on that host
+    ./redirect_index.py host 'app5*'                        # every host starting with app5
+    ./redirect_index.py prefix https://app53dev.int.capoptix.com/auth/
+    ./redirect_index.py hosts                               # every host and its app count
+    ./redirect_index.py hosts --orphans                     # hosts that no longer resolve in DNS
+    ./redirect_index.py hosts --live live_hosts.txt         # hosts not in a list of live ones
+
+Answers come from the inventory's reverse index (redirect and post-logout
+URIs and their hosts -> apps). With ZITADEL_DAEMON set the warm daemon
+answers without any Zitadel call; otherwise the org's apps are crawled
+once (users are skipped) and the index is built locally.
+"""
+import argparse
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+
+from inventory_daemon import query_daemon
+from zitadel_client import ZitadelClient
+from zitadel_inventory import crawl, crawl_all_orgs
+from zitadel_profile import phase, profile_main
+
+DNS_WORKERS = 32
+
+
+def from_daemon(path):
+    hit = query_daemon("GET", path)
+    if hit is None:
+        return None
+    status, data = hit
+    return data if status in (200, 404) else None
+
+
+def load_inventory(args):
+    client = ZitadelClient.from_config(args.config)
+    with phase("app crawl"):
+        return crawl_all_orgs(client, with_users=False) if args.all_orgs else crawl(client, with_users=False)
+
+
+def resolves(host):
+    try:
+        socket.getaddrinfo(host, 443)
+        return True
+    except (socket.gaierror, UnicodeError):
+        return False
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Reverse lookups from redirect URIs and hosts to apps.")
+    ap.add_argument("--config", default="zitadel.conf")
+    ap.add_argument("--all-orgs", action="store_true", help="index the apps of every org visible to the token")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("host", help="apps with a redirect / post-logout URI on HOST (prefix with a trailing *)")
+    p.add_argument("host")
+    p = sub.add_parser("prefix", help="URIs starting with PREFIX and their apps")
+    p.add_argument("prefix")
+    p = sub.add_parser("hosts", help="every host with its number of apps")
+    p.add_argument("--orphans", action="store_true", help="only hosts whose name does not resolve")
+    p.add_argument("--live", help="file of live hosts (one per line): only hosts not listed in it")
+    args = ap.parse_args()
+
+    # the daemon serves its own (configured) org set; --all-orgs always crawls
+    if args.command == "host":
+        data = None if args.all_orgs else from_daemon(f"/hosts/{quote(args.host, safe='*')}")
+        if data is None:
+            inv = load_inventory(args)
+            hits = inv.apps_for_host(args.host)
+            data = {"hosts": {h: [inv.app_ref(a) for a in apps] for h, apps in hits.items()}}
+        for host, apps in sorted(data["hosts"].items()):
+            for app in apps:
+                print(f"{host},{app['app_id']},{app['name']},{app['project_id']},{app['client_id']}")
+        if not data["hosts"]:
+            print(f"# no app points at {args.host}", file=sys.stderr)
+        return
+
+    if args.command == "prefix":
+        data = None if args.all_orgs else from_daemon(f"/uris?prefix={quote(args.prefix, safe='')}")
+        if data is None:
+            inv = load_inventory(args)
+            data = {"uris": [{"uri": uri, "kind": kind, **inv.app_ref(app_id)}
+                             for uri, app_id, kind in inv.apps_for_uri_prefix(args.prefix)]}
+        for hit in data["uris"]:
+            print(f"{hit['uri']},{hit['kind']},{hit['app_id']},{hit['name']},{hit['client_id']}")
+        return
+
+    data = None if args.all_orgs else from_daemon("/hosts")
+    if data is None:
+        inv = load_inventory(args)
+        data = {"hosts": {h: len(apps) for h, apps in sorted(inv.hosts.items())}}
+    hosts = data["hosts"]
+    if args.live:
+        with open(args.live, encoding="utf-8") as f:
+            live = {line.strip().lower() for line in f if line.strip()}
+        hosts = {h: n for h, n in hosts.items() if h not in live}
+    if args.orphans:
+        with phase("dns check"), ThreadPoolExecutor(max_workers=DNS_WORKERS) as pool:
+            alive = dict(zip(hosts, pool.map(resolves, hosts)))
+        hosts = {h: n for h, n in hosts.items() if not alive[h]}
+    for host, n in sorted(hosts.items()):
+        print(f"{host},{n}")
+
+
+if __name__ == "__main__":
+    try:
+        profile_main(main)
+    except requests.HTTPError as e:
+        print("HTTP error:", getattr(e.response, "text", str(e)), file=sys.stderr)
+        sys.exit(2)
+    except Exception as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(3)
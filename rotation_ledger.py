@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Append-only ledger of secret rotations (SQLite, stdlib only).
+
+Every rotation attempt -- successful or not -- is one row: instance, org,
+scope, resource id, client id, timestamp, outcome and a short SHA-256
+fingerprint of the new secret. The secret itself is never stored.
+UPDATE/DELETE are refused by triggers; client_id and resource_id are
+indexed together with the timestamp, so both lookups below are index scans:
+
+    ./rotation_ledger.py last 301926079046713354      # by client id or resource id
+    ./rotation_ledger.py stale --days 90              # ledger rows only
+    ./rotation_ledger.py stale --days 90 --inventory  # + inventory items never rotated
+    ./rotation_ledger.py tail -n 20
+
+The path comes from [ledger] path in zitadel.conf or ZITADEL_LEDGER.
+"""
+import argparse
+import configparser
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+LEDGER_PATH = os.environ.get("ZITADEL_LEDGER", "rotation_ledger.db")
+STALE_DAYS = 90
+COLUMNS = ["rotated_at", "instance", "org_id", "scope", "project_id", "resource_id", "client_id", "name",
+           "outcome", "fingerprint"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rotations (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    rotated_at  TEXT NOT NULL,
+    instance    TEXT NOT NULL,
+    org_id      TEXT NOT NULL DEFAULT '',
+    scope       TEXT NOT NULL,
+    project_id  TEXT NOT NULL DEFAULT '',
+    resource_id TEXT NOT NULL,
+    client_id   TEXT NOT NULL DEFAULT '',
+    name        TEXT NOT NULL DEFAULT '',
+    outcome     TEXT NOT NULL,
+    fingerprint TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS rotations_client ON rotations (client_id, rotated_at);
+CREATE INDEX IF NOT EXISTS rotations_resource ON rotations (resource_id, rotated_at);
+CREATE TRIGGER IF NOT EXISTS rotations_no_update BEFORE UPDATE ON rotations
+    BEGIN SELECT RAISE(ABORT, 'rotation ledger is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS rotations_no_delete BEFORE DELETE ON rotations
+    BEGIN SELECT RAISE(ABORT, 'rotation ledger is append-only'); END;
+"""
+
+
+def fingerprint(secret):
+    """Short, non-reversible id of a secret, enough to tell two rotations apart."""
+    return "sha256:" + hashlib.sha256(secret.encode()).hexdigest()[:16] if secret else ""
+
+
+def instance_of(domain):
+    return urlparse(domain).netloc or domain
+
+
+class Ledger:
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        new_file = not os.path.exists(path)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        if new_file:
+            os.chmod(path, 0o600)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def record(self, instance, event, outcome="ok"):
+        """
+        Append one rotation attempt. ``event`` is a secret_sinks.secret_event()
+        dict (the secret may be "" for failures); only its fingerprint is kept.
+        """
+        row = {k: event.get(k) or "" for k in COLUMNS}
+        row.update(instance=instance_of(instance), outcome=outcome, fingerprint=fingerprint(event.get("secret")))
+        row["rotated_at"] = row["rotated_at"] or time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with self._lock:
+            self._db.execute(f"INSERT INTO rotations ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                             [row[k] for k in COLUMNS])
+
+    def last_rotation(self, key, ok_only=True):
+        """Latest row for a client id or resource id (successful ones only by default)."""
+        cond = " AND outcome = 'ok'" if ok_only else ""
+        with self._lock:
+            rows = [self._db.execute(f"SELECT * FROM rotations WHERE {col} = ?{cond} "
+                                     f"ORDER BY rotated_at DESC LIMIT 1", (key,)).fetchone()
+                    for col in ("client_id", "resource_id")]
+        rows = [dict(r) for r in rows if r]
+        return max(rows, key=lambda r: r["rotated_at"]) if rows else None
+
+    def stale(self, days=STALE_DAYS):
+        """[(resource_id, last successful rotated_at)] for resources not rotated within ``days``."""
+        cutoff = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - days * 86400))
+        with self._lock:
+            return [tuple(r) for r in self._db.execute(
+                "SELECT resource_id, MAX(rotated_at) FROM rotations WHERE outcome = 'ok' "
+                "GROUP BY resource_id HAVING MAX(rotated_at) < ? ORDER BY 2", (cutoff,))]
+
+    def rotated_resources(self):
+        with self._lock:
+            return {r[0] for r in self._db.execute("SELECT DISTINCT resource_id FROM rotations WHERE outcome = 'ok'")}
+
+    def tail(self, n=20):
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM rotations ORDER BY id DESC LIMIT ?", (n,)).fetchall()
+        return [dict(r) for r in reversed(rows)]
+
+    def close(self):
+        self._db.close()
+
+
+def ledger_from_config(cfg):
+    """Ledger at [ledger] path of a ConfigParser (defaults to LEDGER_PATH)."""
+    return Ledger(cfg.get("ledger", "path", fallback=LEDGER_PATH))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Query the rotation ledger.")
+    ap.add_argument("--config", default="zitadel.conf")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("last", help="last successful rotation of a client id or resource id")
+    p.add_argument("key")
+    p.add_argument("--any", action="store_true", help="include failed attempts")
+    p = sub.add_parser("stale", help="resources not rotated within --days")
+    p.add_argument("--days", type=float, default=STALE_DAYS)
+    p.add_argument("--inventory", action="store_true", help="also list inventory items never rotated")
+    p = sub.add_parser("tail", help="most recent rotation attempts")
+    p.add_argument("-n", type=int, default=20)
+    args = ap.parse_args()
+
+    cfg = configparser.ConfigParser()
+    cfg.read(args.config)
+    ledger = ledger_from_config(cfg)
+
+    if args.cmd == "last":
+        row = ledger.last_rotation(args.key, ok_only=not args.any)
+        if not row:
+            sys.exit(f"No rotation recorded for {args.key}")
+        print(",".join(str(row[k]) for k in COLUMNS))
+    elif args.cmd == "stale":
+        print("resource_id,last_rotated")
+        for resource_id, last in ledger.stale(args.days):
+            print(f"{resource_id},{last}")
+        if args.inventory:
+            from zitadel_client import ZitadelClient
+            from zitadel_inventory import app_type_label, crawl
+            inv = crawl(ZitadelClient.from_config(args.config))
+            rotated = ledger.rotated_resources()
+            apps = [a for a, app in inv.apps.items() if app_type_label(app) in ("OIDC", "API")]
+            for resource_id in apps + list(inv.users):
+                if resource_id not in rotated:
+                    print(f"{resource_id},never")
+    else:
+        print(",".join(COLUMNS))
+        for row in ledger.tail(args.n):
+            print(",".join(str(row[k]) for k in COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Jittered rotation scheduler.
+
+Instead of rotating everything in one burst (zitaldel.py), rotation policies
+from zitadel.conf give every target its own due time, spread evenly over the
+policy's window with random jitter, and rotations are capped per minute so
+the load on Zitadel (and on whatever consumes the new secrets) stays flat.
+
+    [scheduler]
+    state_file = rotation_schedule.json
+    output_csv = rotated_secrets.csv     ; used when no [sink:<name>] is configured
+    max_per_minute = 10
+    jitter_minutes = 30
+
+    [rotation:app-secrets]
+    scope = APP                ; APP or SERVICE_USER
+    every_days = 30
+    window_days = 30           ; first-cycle spread, defaults to every_days
+    match = p9-*               ; optional fnmatch on name / client_id
+
+The schedule is saved after every rotation, so a restarted scheduler resumes
+where it stopped instead of starting a new burst. That file is also the
+resume point for ``--once --deadline 15m``: the crawl gets half the budget,
+no rotation is started (or waited for under the per-minute cap) once it is
+used up, and targets still due simply stay due for the next run.
+"""
+import argparse
+import collections
+import configparser
+import fnmatch
+import json
+import os
+import random
+import sys
+import time
+
+from rotation_ledger import ledger_from_config
+from secret_sinks import CsvSink, Delivery, secret_event, sinks_from_config
+from zitadel_client import DEFAULT_ORG, ZitadelClient
+from zitadel_deadline import PARTIAL_EXIT, Deadline, add_deadline_arg
+from zitadel_inventory import app_type_label, crawl, pick_client_id_from_app, service_user_fields
+from zitadel_preflight import require
+from zitadel_rotation import resource_owner, rotate_app_secret, rotate_service_user_secret
+
+STATE_FILE = "rotation_schedule.json"
+OUTPUT_CSV = "rotated_secrets.csv"
+MAX_PER_MINUTE = 10
+JITTER_MINUTES = 30
+TICK = 15
+INVENTORY_REFRESH = 3600
+DAY = 86400
+
+
+class Policy:
+    def __init__(self, name, scope="APP", every_days=30, window_days=None, match="*"):
+        self.name = name
+        self.scope = scope.upper()
+        self.period = float(every_days) * DAY
+        self.window = float(window_days) * DAY if window_days else self.period
+        self.match = match
+
+    def targets(self, inv):
+        """{key: (name, client_id)} of the inventory items this policy covers."""
+        out = {}
+        if self.scope == "APP":
+            for app_id, app in inv.apps.items():
+                if app_type_label(app) not in ("OIDC", "API"):
+                    continue  # no client secret to rotate
+                name, client_id = app.get("name") or "", str(pick_client_id_from_app(app))
+                if self._matches(name, client_id):
+                    out[f"APP:{app_id}"] = (name, client_id)
+        elif self.scope == "SERVICE_USER":
+            for user_id, user in inv.users.items():
+                _, username, display, client_id = service_user_fields(user)
+                if self._matches(username, display, client_id):
+                    out[f"SERVICE_USER:{user_id}"] = (display, client_id)
+        return out
+
+    def _matches(self, *values):
+        return any(fnmatch.fnmatch(v, self.match) for v in values if v)
+
+
+def load_policies(cfg):
+    policies = []
+    for section in cfg.sections():
+        if not section.startswith("rotation:"):
+            continue
+        s = cfg[section]
+        policies.append(Policy(section.split(":", 1)[1], s.get("scope", "APP"), s.getfloat("every_days", 30),
+                               s.getfloat("window_days", fallback=None), s.get("match", "*")))
+    return policies
+
+
+class Schedule:
+    """Persistent {key: {"policy", "due", "last_rotated", "last_outcome"}}."""
+
+    def __init__(self, path=STATE_FILE, jitter=JITTER_MINUTES * 60):
+        self.path = path
+        self.jitter = jitter
+        self.targets = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.targets = json.load(f).get("targets", {})
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"targets": self.targets}, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def plan(self, policy, targets, now, forget=True):
+        """
+        Give targets not yet scheduled an evenly spaced, jittered due time
+        across the policy window; forget targets that disappeared (only
+        when ``targets`` comes from a complete inventory).
+        """
+        for key in [k for k, t in self.targets.items()
+                    if forget and t["policy"] == policy.name and k not in targets]:
+            del self.targets[key]
+        new = [k for k in targets if k not in self.targets]
+        random.shuffle(new)
+        slot = policy.window / max(len(new), 1)
+        for i, key in enumerate(new):
+            self.targets[key] = {
+                "policy": policy.name,
+                "client_id": targets[key][1],
+                "due": now + i * slot + random.uniform(0, slot),
+                "last_rotated": None,
+                "last_outcome": None,
+            }
+
+    def due(self, now):
+        return sorted((t["due"], k) for k, t in self.targets.items() if t["due"] <= now)
+
+    def done(self, key, policy, now, outcome):
+        t = self.targets[key]
+        t["last_outcome"] = outcome
+        if outcome == "ok":
+            t["last_rotated"] = now
+            t["due"] = now + policy.period + random.uniform(-self.jitter, self.jitter)
+        else:
+            # retry later without hammering a failing target
+            t["due"] = now + min(policy.period, 3600) + random.uniform(0, self.jitter)
+
+
+class MinuteCap:
+    def __init__(self, per_minute=MAX_PER_MINUTE):
+        self.per_minute = per_minute
+        self._sent = collections.deque()
+
+    def wait(self, deadline=None):
+        """Block until a slot is free; False if that would be after ``deadline``."""
+        while True:
+            now = time.time()
+            while self._sent and now - self._sent[0] >= 60:
+                self._sent.popleft()
+            if len(self._sent) < self.per_minute:
+                self._sent.append(now)
+                return True
+            pause = 60 - (now - self._sent[0])
+            if deadline is not None and pause >= deadline.remaining():
+                return False
+            time.sleep(pause)
+
+
+def rotate_key(client, inv, key):
+    scope, resource_id = key.split(":", 1)
+    if scope == "APP":
+        return rotate_app_secret(client, inv.find_project_for_app(resource_id), inv.apps[resource_id],
+                                 inv.org_for_app(resource_id) or DEFAULT_ORG)
+    user = inv.users.get(resource_id) or {}
+    return rotate_service_user_secret(client, resource_id, owner=resource_owner(user))
+
+
+def key_event(inv, key, secret, client_id):
+    scope, resource_id = key.split(":", 1)
+    if scope == "APP":
+        app = inv.apps.get(resource_id) or {}
+        project_id = inv.find_project_for_app(resource_id)
+        org_id = inv.org_for_app(resource_id)
+        return secret_event(scope, resource_id, secret, client_id, app.get("name"), org_id, project_id)
+    user = inv.users.get(resource_id) or {}
+    return secret_event(scope, resource_id, secret, client_id, service_user_fields(user)[2], resource_owner(user))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rotate secrets on a flat, jittered schedule.")
+    ap.add_argument("--config", default="zitadel.conf")
+    ap.add_argument("--once", action="store_true", help="rotate what is due now and exit (cron mode)")
+    ap.add_argument("--dry-run", action="store_true", help="print the schedule, rotate nothing")
+    add_deadline_arg(ap)
+    args = ap.parse_args()
+    if args.deadline and not args.once:
+        ap.error("--deadline only applies to --once runs")
+
+    cfg = configparser.ConfigParser()
+    cfg.read(args.config)
+    sched_cfg = cfg["scheduler"] if cfg.has_section("scheduler") else {}
+    policies = {p.name: p for p in load_policies(cfg)}
+    if not policies:
+        sys.exit("No [rotation:<name>] policies in config")
+
+    client = ZitadelClient.from_config(args.config)
+    if not args.dry_run:
+        scopes = {p.scope for p in policies.values()}
+        require(client, "project_search", *(["app_secret"] if "APP" in scopes else []),
+                *(["user_secret"] if "SERVICE_USER" in scopes else []))
+    schedule = Schedule(sched_cfg.get("state_file", STATE_FILE),
+                        float(sched_cfg.get("jitter_minutes", JITTER_MINUTES)) * 60)
+    cap = MinuteCap(int(sched_cfg.get("max_per_minute", MAX_PER_MINUTE)))
+    # sinks run on their own threads; the default is the CSV from [scheduler]
+    delivery = Delivery(sinks_from_config(cfg) or [CsvSink(sched_cfg.get("output_csv", OUTPUT_CSV))])
+    ledger = ledger_from_config(cfg)
+
+    deadline = Deadline(args.deadline)
+    inv, inv_loaded = None, 0
+    while True:
+        now = time.time()
+        if inv is None or now - inv_loaded > INVENTORY_REFRESH:
+            client.memo.clear()  # memoized reads are per inventory cycle
+            client.deadline = crawl_deadline = deadline.share(0.5)
+            inv, inv_loaded = crawl(client, deadline=crawl_deadline), now
+            client.deadline = None
+            if not inv.complete:
+                print(f"# crawl cut short by the deadline, skipped: {inv.pending}", file=sys.stderr)
+            for key in [k for k, t in schedule.targets.items() if t["policy"] not in policies]:
+                del schedule.targets[key]  # policy removed from the config
+            for p in policies.values():
+                schedule.plan(p, p.targets(inv), now, forget=inv.complete)
+            if not args.dry_run:
+                schedule.save()
+
+        if args.dry_run:
+            for key, t in sorted(schedule.targets.items(), key=lambda kv: kv[1]["due"]):
+                print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(t['due']))},{t['policy']},{key}")
+            return
+
+        due = schedule.due(now)
+        for i, (_, key) in enumerate(due):
+            policy = policies[schedule.targets[key]["policy"]]
+            if deadline.expired() or not cap.wait(deadline):
+                print(f"# deadline reached: {len(due) - i} due targets left for the next run", file=sys.stderr)
+                sys.exit(PARTIAL_EXIT)
+            if key.split(":", 1)[1] not in (inv.apps if key.startswith("APP:") else inv.users):
+                continue  # not in this (partial) inventory; stays due
+            try:
+                secret = rotate_key(client, inv, key)
+                outcome = "ok" if secret else "no secret in response"
+            except Exception as e:
+                secret, outcome = "", f"ERROR: {e}"
+            schedule.done(key, policy, time.time(), outcome)
+            schedule.save()
+            event = key_event(inv, key, secret, schedule.targets[key].get("client_id", ""))
+            ledger.record(client.domain, event, outcome)
+            if secret:
+                delivery.publish(event)
+            print(f"# {policy.name} {key}: {outcome}", file=sys.stderr)
+
+        if args.once:
+            return
+        time.sleep(TICK)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
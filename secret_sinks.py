@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Asynchronous delivery of rotated secrets.
+
+Rotation code only calls Delivery.publish(); every sink (CSV, secrets.env
+for ts_config.sh, a local 0600 JSON store, a Postgres table, stdout) has its
+own bounded queue and worker thread, so a slow sink never holds up the
+rotation loop. When a queue is full publish() blocks (backpressure) instead
+of buffering without limit, and close() -- also registered with atexit --
+drains every queue before the process exits.
+
+Sinks are configured in zitadel.conf:
+
+    [sink:backend-env]
+    type = env                 ; csv | env | store | postgres | stdout
+    path = secrets.env
+    map = 301926079046713354:P9_BACKEND_CLIENT_SECRET, p9-service-dev-a:P9_SERVICE_DEV_A_CLIENT_SECRET
+"""
+import atexit
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+try:
+    import psycopg2
+except ImportError:  # optional, only for the postgres sink
+    psycopg2 = None
+
+QUEUE_SIZE = 100
+FIELDS = ["rotated_at", "scope", "org_id", "project_id", "resource_id", "name", "client_id", "secret"]
+
+
+def secret_event(scope, resource_id, secret, client_id="", name="", org_id="", project_id=""):
+    return {
+        "rotated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "scope": scope,
+        "org_id": org_id or "",
+        "project_id": project_id or "",
+        "resource_id": resource_id or "",
+        "name": name or "",
+        "client_id": client_id or "",
+        "secret": secret,
+    }
+
+
+def _replace_file(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+# ----------------- sinks -----------------
+class CsvSink:
+    """Appends one row per secret (header written once)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, event):
+        new_file = not os.path.exists(self.path)
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=FIELDS)
+            if new_file:
+                w.writeheader()
+            w.writerow(event)
+
+
+class StdoutSink:
+    def write(self, event):
+        print(f"{event['name'] or event['client_id'] or event['resource_id']},{event['secret']}", flush=True)
+
+
+class EnvFileSink:
+    """
+    Keeps KEY='secret' lines of an env file (secrets.env for ts_config.sh)
+    current; ``mapping`` maps client_id / resource_id / name -> variable.
+    """
+
+    def __init__(self, path, mapping):
+        self.path = path
+        self.mapping = mapping
+
+    def write(self, event):
+        var = next((self.mapping[k] for k in (event["client_id"], event["resource_id"], event["name"])
+                    if k in self.mapping), None)
+        if not var:
+            return
+        lines = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                lines = [l for l in f.read().splitlines() if not l.startswith(f"{var}=")]
+        value = event["secret"].replace("'", "'\\''")
+        lines.append(f"{var}='{value}'")
+        _replace_file(self.path, "\n".join(lines) + "\n")
+
+
+class LocalStoreSink:
+    """0600 JSON file {client_id or resource_id: {"current": event, "previous": event}}."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, event):
+        store = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                store = json.load(f)
+        key = event["client_id"] or event["resource_id"]
+        store[key] = {"current": event, "previous": (store.get(key) or {}).get("current")}
+        _replace_file(self.path, json.dumps(store, indent=1))
+
+
+class PostgresSink:
+    def __init__(self, dsn, table="zitadel_secrets"):
+        if psycopg2 is None:
+            raise RuntimeError("postgres sink needs psycopg2 (pip install psycopg2-binary)")
+        self.table = table
+        self.conn = psycopg2.connect(dsn)
+
+    def write(self, event):
+        cols = ", ".join(FIELDS)
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute(f"INSERT INTO {self.table} ({cols}) VALUES ({', '.join(['%s'] * len(FIELDS))})",
+                        [event[k] for k in FIELDS])
+
+    def close(self):
+        self.conn.close()
+
+
+def _parse_map(text):
+    pairs = (p.strip().rsplit(":", 1) for p in (text or "").split(",") if ":" in p)
+    return {k.strip(): v.strip() for k, v in pairs}
+
+def sinks_from_config(cfg):
+    """Build sinks from the [sink:<name>] sections of a ConfigParser."""
+    sinks = []
+    for section in cfg.sections():
+        if not section.startswith("sink:"):
+            continue
+        s = cfg[section]
+        kind = s.get("type", "csv")
+        if kind == "csv":
+            sinks.append(CsvSink(s.get("path", "rotated_secrets.csv")))
+        elif kind == "env":
+            sinks.append(EnvFileSink(s.get("path", "secrets.env"), _parse_map(s.get("map"))))
+        elif kind == "store":
+            sinks.append(LocalStoreSink(s.get("path", "secret_store.json")))
+        elif kind == "postgres":
+            sinks.append(PostgresSink(s["dsn"], s.get("table", "zitadel_secrets")))
+        elif kind == "stdout":
+            sinks.append(StdoutSink())
+        else:
+            raise ValueError(f"[{section}]: unknown sink type '{kind}'")
+    return sinks
+
+
+# ----------------- delivery -----------------
+class Delivery:
+    """Fan-out of secret events to sinks, one bounded queue + worker per sink."""
+
+    _STOP = object()
+
+    def __init__(self, sinks, maxsize=QUEUE_SIZE):
+        self.sinks = list(sinks)
+        self.failures = 0
+        self._queues = [queue.Queue(maxsize) for _ in self.sinks]
+        self._threads = [threading.Thread(target=self._work, args=(s, q), daemon=True)
+                         for s, q in zip(self.sinks, self._queues)]
+        self._closed = False
+        for t in self._threads:
+            t.start()
+        atexit.register(self.close)
+
+    def _work(self, sink, q):
+        while True:
+            event = q.get()
+            if event is self._STOP:
+                break
+            try:
+                sink.write(event)
+            except Exception as e:
+                self.failures += 1
+                print(f"# {type(sink).__name__} failed for {event.get('resource_id')}: {e}", file=sys.stderr)
+        if hasattr(sink, "close"):
+            sink.close()
+
+    def publish(self, event):
+        for q in self._queues:
+            q.put(event)
+
+    def close(self):
+        """Flush every queue and wait for the sink workers to finish."""
+        if self._closed:
+            return
+        self._closed = True
+        for q in self._queues:
+            q.put(self._STOP)
+        for t in self._threads:
+            t.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
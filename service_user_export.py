@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Export machine users as service_users.csv, enriched with per-user details.
+
+The v2 listing already carries id, username, state and change date. The
+rest (display name, type, creation date, keys, PATs, metadata) needs four
+reads per user, so those run as a separate enrichment stage:
+
+  - users are enriched concurrently on --workers threads, each read with
+    memo=True so the same request is never sent twice in a run;
+  - results are kept in a local cache (--cache) keyed by user id and
+    change_date. Adding keys, PATs or metadata changes the user's
+    change_date, so only users whose change_date moved are fetched again
+    and a re-export of thousands of unchanged users costs just the listing.
+
+    ./service_user_export.py                         # org from zitadel.conf
+    ./service_user_export.py --all-orgs -o all_users.csv
+    ./service_user_export.py --username 'p9-service-*' --no-cache
+"""
+import argparse
+import base64
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from zitadel_client import DEFAULT_ORG, ZitadelClient
+from zitadel_inventory import (SearchFilter, add_filter_args, extract, list_orgs, list_service_users,
+                               service_user_fields)
+from zitadel_profile import phase, profile_main
+
+FIELDNAMES = ["org_id", "user_id", "username", "display_name", "type", "state", "creation_date", "change_date",
+              "access_token_type", "keys", "pats", "metadata"]
+CACHE_FILE = "service_users_cache.json"
+WORKERS = 8
+
+
+# ----------------- cache -----------------
+def load_cache(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("users") or {}
+
+
+def save_cache(path, users):
+    tmp = f"{path}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)  # metadata may be sensitive
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"users": users}, f)
+    os.replace(tmp, path)
+
+
+# ----------------- enrichment -----------------
+def _metadata(items):
+    pairs = []
+    for m in items:
+        try:
+            value = base64.b64decode(m.get("value") or "").decode("utf-8")
+        except ValueError:
+            value = m.get("value") or ""
+        pairs.append(f"{m.get('key')}={value}")
+    return ";".join(sorted(pairs))
+
+
+def enrich(client, user_id, owner):
+    """The per-user columns: v1 user detail, key / PAT counts and metadata."""
+    base = f"/management/v1/users/{user_id}"
+    detail = client.get(base, org_id=owner, memo=True)
+    u = detail.get("user") or detail
+    machine = u.get("machine") or {}
+    keys = list(client.search(f"{base}/keys/_search", org_id=owner, memo=True))
+    pats = list(client.search(f"{base}/pats/_search", org_id=owner, memo=True))
+    metadata = list(client.search(f"{base}/metadata/_search", org_id=owner, memo=True))
+    return {
+        "display_name": machine.get("name") or extract(u, ["human", "profile", "displayName"]) or "",
+        "type": "MACHINE" if machine else "HUMAN",
+        "creation_date": extract(u, ["details", "creationDate"]) or "",
+        "access_token_type": machine.get("accessTokenType") or "",
+        "keys": len(keys),
+        "pats": len(pats),
+        "metadata": _metadata(metadata),
+    }
+
+
+def listing_row(u):
+    user_id, username, display, _ = service_user_fields(u)
+    return {
+        "org_id": extract(u, ["details", "resourceOwner"]) or "",
+        "user_id": user_id,
+        "username": username,
+        "display_name": extract(u, ["machine", "name"]) or display,
+        "type": "MACHINE",
+        "state": u.get("state") or "",
+        "creation_date": extract(u, ["details", "creationDate"]) or "",
+        "change_date": extract(u, ["details", "changeDate"]) or "",
+    }
+
+
+def enrich_rows(client, rows, cache, workers=WORKERS):
+    """Fill the enriched columns in place; returns (fetched, cached, failed) counts."""
+    stale = []
+    for row in rows:
+        hit = cache.get(row["user_id"])
+        if hit and hit.get("change_date") == row["change_date"]:
+            row.update(hit["enriched"])
+        else:
+            stale.append(row)
+
+    def one(row):
+        return row, enrich(client, row["user_id"], row["org_id"] or None)
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(one, row) for row in stale]
+        for fut in futures:
+            try:
+                row, enriched = fut.result()
+            except requests.HTTPError as e:
+                failed += 1
+                print(f"# enrich failed: {getattr(e.response, 'text', e)}", file=sys.stderr)
+                continue
+            row.update(enriched)
+            cache[row["user_id"]] = {"change_date": row["change_date"], "enriched": enriched}
+    return len(stale) - failed, len(rows) - len(stale), failed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export enriched machine users as CSV.")
+    ap.add_argument("--config", default="zitadel.conf")
+    ap.add_argument("--all-orgs", action="store_true", help="list machine users of every org visible to the token")
+    ap.add_argument("-o", "--output", default="service_users.csv")
+    ap.add_argument("--cache", default=CACHE_FILE, help="enrichment cache (keyed by user id + change_date)")
+    ap.add_argument("--no-cache", action="store_true", help="re-enrich every user")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    add_filter_args(ap)
+    args = ap.parse_args()
+
+    client = ZitadelClient.from_config(args.config)
+    filters = SearchFilter.from_args(args)
+    with phase("user listing"):
+        orgs = [o["id"] for o in list_orgs(client)] if args.all_orgs else [client.org_id or DEFAULT_ORG]
+        users = {}
+        for org in filters.org_ids or orgs:
+            for u in list_service_users(client, org, extra_queries=filters.user_queries()):
+                if filters.match_user(u):
+                    users[service_user_fields(u)[0]] = u
+    rows = [listing_row(u) for u in users.values()]
+
+    cache = {} if args.no_cache else load_cache(args.cache)
+    with phase("enrichment"):
+        fetched, cached, failed = enrich_rows(client, rows, cache, args.workers)
+    if args.cache:
+        if not filters:
+            # a full export: forget users that no longer exist
+            live = {r["user_id"] for r in rows}
+            cache = {k: v for k, v in cache.items() if k in live}
+        save_cache(args.cache, cache)
+
+    with phase("csv writing"), open(args.output, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        w.writeheader()
+        w.writerows(sorted(rows, key=lambda r: (r["org_id"], r["username"])))
+    print(f"Wrote {len(rows)} service users to {args.output} "
+          f"({fetched} enriched, {cached} from cache, {failed} failed)", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        profile_main(main)
+    except requests.HTTPError as e:
+        print("HTTP error:", getattr(e.response, "text", str(e)), file=sys.stderr)
+        sys.exit(2)
+    except Exception as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(3)
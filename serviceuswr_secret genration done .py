@@ -1,22 +1,12 @@
-import requests, json
+import json
 
-DOMAIN = "https://app248dev-zitadel.int.capoptix.com"
-ACCESS_TOKEN = "NIJmsMJlrMy8HHNPZAVJyndbdwq3ifpO8rTJI4bOczi0cqlMk5pT0ZXAjKeUerDi"            # must have user.write on the user's org
-ORG_ID_HINT = "301926074198032394"  # what you're currently using; we’ll override with resourceOwner
-USER_ID = "304678892734545930"
-TIMEOUT = 30
-
-BASE_HEADERS = {
-    "Authorization": f"Bearer {ACCESS_TOKEN}",
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-}
+from zitadel_client import ZitadelClient
 
-def _h(org_id=None):
-    h = dict(BASE_HEADERS)
-    if org_id:
-        h["x-zitadel-orgid"] = org_id
-    return h
+# domain, org_id and the token (access_token or client credentials) come from zitadel.conf;
+# the token must have user.write on the user's org
+CLIENT = ZitadelClient.from_config("zitadel.conf")
+ORG_ID_HINT = CLIENT.org_id  # what you're currently using; we’ll override with resourceOwner
+USER_ID = "304678892734545930"
 
 def _extract_user(payload):
     # responses can be flat or nested under "user"
@@ -34,7 +24,7 @@ def _resource_owner(payload):
 def rotate_service_user_secret():
     # 1) Read user (first with hint, then without)
     for org in (ORG_ID_HINT, None):
-        r = requests.get(f"{DOMAIN}/v2/users/{USER_ID}", headers=_h(org), timeout=TIMEOUT)
+        r = CLIENT.request("GET", f"/v2/users/{USER_ID}", org_id=org)
         if r.status_code == 404:
             continue
         r.raise_for_status()
@@ -48,7 +38,7 @@ def rotate_service_user_secret():
 
         # 2) Rotate on v2 using the owning org, then fallback without org header
         for try_org in (owner, None):
-            rr = requests.post(f"{DOMAIN}/v2/users/{USER_ID}/secret", headers=_h(try_org), json={}, timeout=TIMEOUT)
+            rr = CLIENT.request("POST", f"/v2/users/{USER_ID}/secret", {}, org_id=try_org)
             if rr.status_code == 404:
                 continue
             if rr.status_code == 403:
@@ -61,8 +51,7 @@ def rotate_service_user_secret():
             return secret
 
         # 3) Last resort: mgmt v1 (deprecated but often enabled)
-        rr = requests.put(f"{DOMAIN}/management/v1/users/{USER_ID}/secret",
-                          headers=_h(owner), json={}, timeout=TIMEOUT)
+        rr = CLIENT.request("PUT", f"/management/v1/users/{USER_ID}/secret", {}, org_id=owner)
         if rr.status_code == 404:
             raise RuntimeError("Not found via v1 either: org mismatch or deleted user.")
         if rr.status_code == 403:
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Load generator for the Zitadel token endpoint (client-credentials grants).
+
+Service users come from service_users.csv (username, org_id, ...) and their
+secrets from a CSV with username/client_id + secret columns, e.g. the CSV
+sink of the rotation tools. Requests are issued open-loop at a fixed --rate
+or along a --ramp, and latency is measured from each request's scheduled
+start, so a saturated endpoint shows up as latency instead of silently
+lowering the offered load.
+
+    ./token_loadtest.py --secrets rotated_secrets.csv --rate 50 --duration 60
+    ./token_loadtest.py --secrets s.csv --ramp 10:200:120 --concurrency 64
+
+    # against a local stand-in endpoint (no Zitadel needed)
+    ./token_loadtest.py --stub 8089 --stub-latency-ms 20 --rate 100 --duration 10
+"""
+import argparse
+import collections
+import csv
+import json
+import queue
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from zitadel_auth import DEFAULT_SCOPE
+from zitadel_client import load_config
+
+USERS_CSV = "service_users.csv"
+TIMEOUT = 30
+
+
+def load_credentials(users_csv, secrets_csv):
+    """[(username, secret)] for every service user that has a secret."""
+    secrets = {}
+    with open(secrets_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            key = row.get("username") or row.get("client_id") or ""
+            secret = row.get("secret") or row.get("new_secret") or row.get("client_secret") or ""
+            if key and secret:
+                secrets[key] = secret
+    creds = []
+    with open(users_csv, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            username = row.get("username") or ""
+            if username in secrets:
+                creds.append((username, secrets[username]))
+    return creds
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def schedule(rate, ramp, duration):
+    """Yield request offsets (seconds from start) for a fixed rate or a start:end:seconds ramp."""
+    if ramp:
+        start, end, ramp_s = (float(x) for x in ramp.split(":"))
+    else:
+        start = end = float(rate)
+        ramp_s = duration
+    t = 0.0
+    while t < duration:
+        yield t
+        current = start + (end - start) * min(t / ramp_s, 1.0) if ramp_s else end
+        t += 1.0 / max(current, 0.001)
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.outcomes = collections.Counter()
+
+    def add(self, latency, outcome):
+        with self.lock:
+            self.latencies.append(latency)
+            self.outcomes[outcome] += 1
+
+    def report(self, wall):
+        lat = sorted(self.latencies)
+        total = len(lat)
+        errors = total - self.outcomes.get("200", 0)
+        print(f"requests       {total}")
+        print(f"duration       {wall:.1f}s")
+        print(f"throughput     {total / wall if wall else 0:.1f} req/s")
+        print(f"error rate     {100.0 * errors / total if total else 0:.2f}%")
+        for p in (50, 90, 95, 99):
+            print(f"latency p{p:<3}   {1000 * percentile(lat, p):.1f} ms")
+        print(f"latency max    {1000 * (lat[-1] if lat else 0):.1f} ms")
+        print("outcomes       " + ", ".join(f"{k}={v}" for k, v in sorted(self.outcomes.items())))
+
+
+def run(token_url, creds, scope, rate, ramp, duration, concurrency):
+    results = Results()
+    work = queue.Queue(maxsize=concurrency * 4)
+    local = threading.local()
+
+    def worker():
+        local.session = requests.Session()
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            due, (username, secret) = item
+            try:
+                r = local.session.post(token_url, data={"grant_type": "client_credentials", "scope": scope},
+                                       auth=(username, secret), timeout=TIMEOUT)
+                outcome = str(r.status_code)
+            except requests.RequestException as e:
+                outcome = type(e).__name__
+            # measured from the scheduled start, so queueing delay counts
+            results.add(time.perf_counter() - due, outcome)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    t0 = time.perf_counter()
+    for i, offset in enumerate(schedule(rate, ramp, duration)):
+        due = t0 + offset
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        work.put((due, creds[i % len(creds)]))
+    for _ in threads:
+        work.put(None)
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - t0
+
+
+# ----------------- local stand-in token endpoint -----------------
+def start_stub(port, latency_ms=0.0, error_rate=0.0):
+    counter = collections.Counter()
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            with lock:
+                counter["n"] += 1
+                # spreads exactly error_rate of the answers as 429s, also for rates above 0.5
+                fail = int(counter["n"] * error_rate) > int((counter["n"] - 1) * error_rate)
+            time.sleep(latency_ms / 1000.0)
+            code, body = (429, {"error": "slow_down"}) if fail else \
+                (200, {"access_token": f"stub-{counter['n']}", "token_type": "Bearer", "expires_in": 3600})
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}/oauth/v2/token"
+
+
+def fraction(value):
+    """argparse type for a rate between 0 and 1."""
+    rate = float(value)
+    if not 0.0 <= rate <= 1.0:
+        raise argparse.ArgumentTypeError(f"{value} is not between 0 and 1")
+    return rate
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load-test the token endpoint with client-credentials grants.")
+    ap.add_argument("--config", default="zitadel.conf")
+    ap.add_argument("--users", default=USERS_CSV, help="service users CSV (needs a username column)")
+    ap.add_argument("--secrets", help="CSV with username/client_id and secret columns")
+    ap.add_argument("--token-url", help="default: <domain>/oauth/v2/token from the config")
+    ap.add_argument("--scope", default=DEFAULT_SCOPE)
+    ap.add_argument("--rate", type=float, default=10.0, help="requests per second")
+    ap.add_argument("--ramp", help="start:end:seconds, overrides --rate")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--stub", type=int, metavar="PORT", help="start a local stand-in token endpoint and target it")
+    ap.add_argument("--stub-latency-ms", type=float, default=10.0)
+    ap.add_argument("--stub-error-rate", type=fraction, default=0.0, help="share of 429 answers, 0..1")
+    args = ap.parse_args()
+
+    if args.stub:
+        token_url = start_stub(args.stub, args.stub_latency_ms, args.stub_error_rate)
+        creds = [("stub-user", "stub-secret")]
+    else:
+        if not args.secrets:
+            sys.exit("--secrets is required unless --stub is used")
+        token_url = args.token_url or f"{load_config(args.config)['domain'].rstrip('/')}/oauth/v2/token"
+        creds = load_credentials(args.users, args.secrets)
+        if not creds:
+            sys.exit(f"No service user in {args.users} has a secret in {args.secrets}")
+
+    print(f"# {token_url}: {len(creds)} service users, "
+          f"{'ramp ' + args.ramp if args.ramp else f'{args.rate:g} req/s'} for {args.duration:g}s", file=sys.stderr)
+    results, wall = run(token_url, creds, args.scope, args.rate, args.ramp, args.duration, args.concurrency)
+    results.report(wall)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -1,6 +1,12 @@
 #!/usr/bin/env python3
 import requests, json, configparser, sys, os, socket
 
+from inventory_daemon import query_daemon
+from zitadel_auth import auth_from_config
+from zitadel_client import ZitadelClient
+from zitadel_preflight import PreflightError, require
+from zitadel_profile import phase, profile_main
+
 def get_primary_ipv4() -> str:
     for target in ("8.8.8.8", "1.1.1.1"):
         try:
@@ -36,65 +42,47 @@ REDIRECT_URIS = [f"https://app{last_octet}dev.int.capoptix.com/auth/callback"]
 POST_LOGOUT_URIS = [f"https://app{last_octet}dev.int.capoptix.com/app-web/"]
 TIMEOUT = 30
 
-cfg = configparser.ConfigParser()
-cfg.read("zitadel.conf")
+with phase("config load"):
+    cfg = configparser.ConfigParser()
+    cfg.read("zitadel.conf")
 
 try:
     DOMAIN       = cfg.get("zitadel", "domain").rstrip("/")
-    ACCESS_TOKEN = cfg.get("zitadel", "access_token")
     ORG_ID       = cfg.get("zitadel", "org_id")
 except Exception as e:
     print(f"Missing zitadel.conf keys: {e}", file=sys.stderr)
     sys.exit(2)
 
-HEADERS = {
-    "Authorization": f"Bearer {ACCESS_TOKEN}",
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-    "x-zitadel-orgid": ORG_ID,
-}
+CLIENT = ZitadelClient(DOMAIN, auth_from_config(cfg["zitadel"]), ORG_ID, timeout=TIMEOUT)
 
 def http_post(url, payload):
-    r = requests.post(url, headers=HEADERS, json=payload, timeout=TIMEOUT)
-    r.raise_for_status()
-    return r.json()
+    return CLIENT.post(url, payload)
 
 def http_put(url, payload):
-    r = requests.put(url, headers=HEADERS, json=payload, timeout=TIMEOUT)
-    r.raise_for_status()
-    return r.json()
+    return CLIENT.put(url, payload)
 
 def list_projects(limit=200):
-    url = f"{DOMAIN}/management/v1/projects/_search"
-    projects, offset = [], 0
-    while True:
-        page = http_post(url, {"limit": limit, "offset": offset, "asc": True, "queries": []})
-        chunk = page.get("result") or page.get("projects") or []
-        projects.extend(chunk)
-        if len(chunk) < limit:
-            return projects
-        offset += len(chunk)
+    return CLIENT.search("/management/v1/projects/_search", result_keys=("result", "projects"), limit=limit,
+                         memo=True)
 
 def list_apps(project_id, limit=200):
-    url = f"{DOMAIN}/management/v1/projects/{project_id}/apps/_search"
-    apps, offset = [], 0
-    while True:
-        page = http_post(url, {"limit": limit, "offset": offset, "asc": True, "queries": []})
-        chunk = page.get("result") or page.get("apps") or []
-        apps.extend(chunk)
-        if len(chunk) < limit:
-            return apps
-        offset += len(chunk)
+    return CLIENT.search(f"/management/v1/projects/{project_id}/apps/_search",
+                         result_keys=("result", "apps"), limit=limit, memo=True)
 
 def find_project_for_app(app_id):
+    # A running inventory_daemon answers this without crawling
+    hit = query_daemon("GET", f"/apps/{app_id}/project")
+    if hit and hit[0] == 200:
+        return hit[1].get("project_id")
     for p in list_projects():
         pid = p.get("id") or p.get("projectId")
         if not pid:
             continue
         try:
-            for app in list_apps(pid):
-                if (app.get("id") or "") == app_id:
-                    return pid
+            with phase("app listing"):
+                for app in list_apps(pid):
+                    if (app.get("id") or "") == app_id:
+                        return pid
         except Exception as e:
             print(f"# warn: listing apps failed for project {pid}: {e}", file=sys.stderr)
     return None
@@ -111,6 +99,12 @@ def update_redirects(project_id, app_id, redirects, post_logout):
 
 # ---- Main ----
 def main():
+    try:
+        require(CLIENT, "project_search", "oidc_config")
+    except PreflightError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(4)
+
     print(f"# Looking up project for app_id={APP_ID} ...")
     project_id = find_project_for_app(APP_ID)
     if not project_id:
@@ -121,7 +115,8 @@ def main():
     print("# Updating redirect URIs...")
 
     try:
-        resp = update_redirects(project_id, APP_ID, REDIRECT_URIS, POST_LOGOUT_URIS)
+        with phase("oidc_config update"):
+            resp = update_redirects(project_id, APP_ID, REDIRECT_URIS, POST_LOGOUT_URIS)
     except requests.HTTPError as e:
         print("HTTP error:", getattr(e.response, "text", str(e)), file=sys.stderr)
         sys.exit(3)
@@ -135,4 +130,4 @@ def main():
     }, indent=2))
 
 if __name__ == "__main__":
-    main()
+    profile_main(main)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Access tokens for the shared client.
+
+Besides a static PAT/access_token, the client can mint its own tokens:
+  - client credentials (client_id + client_secret of a service user)
+  - JWT profile (service-user key file downloaded from the console;
+    needs PyJWT + cryptography)
+
+Minted tokens live in a JSON cache file shared by every process on the box.
+Reads and refreshes happen under an exclusive flock, so parallel cron jobs
+reuse one token instead of each minting their own, and a token is refreshed
+REFRESH_MARGIN seconds before it expires so long bulk runs never hit a 401.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+
+import requests
+
+try:
+    import jwt
+except ImportError:  # optional, only needed for JWT-profile keys
+    jwt = None
+
+TIMEOUT = 30
+REFRESH_MARGIN = 300
+DEFAULT_SCOPE = "openid urn:zitadel:iam:org:project:id:zitadel:aud"
+TOKEN_CACHE = os.environ.get("ZITADEL_TOKEN_CACHE", os.path.expanduser("~/.cache/zitadel/tokens.json"))
+
+
+class StaticToken:
+    """A fixed PAT / access_token from zitadel.conf."""
+
+    def __init__(self, token):
+        self._token = token
+
+    def token(self):
+        return self._token
+
+    def invalidate(self):
+        pass
+
+
+class TokenCache:
+    """
+    flock-protected JSON file: {cache_key: {"access_token", "expires_at"}}.
+    Safe to share between threads: they queue on a thread lock before the
+    flock, and each ``with`` keeps its own lock fd.
+    """
+
+    def __init__(self, path=TOKEN_CACHE):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._local = threading.local()
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._thread_lock.acquire()
+        try:
+            fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                raise
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._local.fd = fd
+        return self
+
+    def __exit__(self, *exc):
+        fd, self._local.fd = self._local.fd, None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        finally:
+            self._thread_lock.release()
+
+    def read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write(self, entries):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.path)
+
+
+class OAuthToken:
+    """
+    Base for minted tokens. Subclasses implement _grant() returning the form
+    body for POST /oauth/v2/token (and optionally _auth()).
+    """
+
+    def __init__(self, domain, scope=DEFAULT_SCOPE, cache_path=TOKEN_CACHE, refresh_margin=REFRESH_MARGIN):
+        self.domain = domain.rstrip("/")
+        self.scope = scope
+        self.cache = TokenCache(cache_path)
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0
+
+    @property
+    def cache_key(self):
+        return f"{self.domain}|{type(self).__name__}|{self.client_id}|{self.scope}"
+
+    def _fresh(self, expires_at):
+        return expires_at - self.refresh_margin > time.time()
+
+    def token(self):
+        if self._token and self._fresh(self._expires_at):
+            return self._token
+        with self.cache:
+            entries = self.cache.read()
+            entry = entries.get(self.cache_key) or {}
+            if not (entry.get("access_token") and self._fresh(entry.get("expires_at", 0))):
+                entry = self._mint()
+                entries = {k: v for k, v in entries.items() if v.get("expires_at", 0) > time.time()}
+                entries[self.cache_key] = entry
+                self.cache.write(entries)
+        self._token, self._expires_at = entry["access_token"], entry["expires_at"]
+        return self._token
+
+    def invalidate(self):
+        """Drop a token the server rejected so the next token() mints a new one."""
+        rejected = self._token
+        with self.cache:
+            entries = self.cache.read()
+            # another thread may have dropped it (or minted the next one) already
+            if rejected and entries.get(self.cache_key, {}).get("access_token") == rejected:
+                entries.pop(self.cache_key)
+                self.cache.write(entries)
+        if self._token == rejected:
+            self._token, self._expires_at = None, 0
+
+    def _auth(self):
+        return None
+
+    def _mint(self):
+        r = requests.post(f"{self.domain}/oauth/v2/token", data=self._grant(), auth=self._auth(),
+                          headers={"Accept": "application/json"}, timeout=TIMEOUT)
+        r.raise_for_status()
+        data = r.json()
+        token = data.get("access_token")
+        if not token:
+            raise RuntimeError(f"No access_token in token response: {json.dumps(data)}")
+        return {"access_token": token, "expires_at": time.time() + int(data.get("expires_in") or 3600)}
+
+
+class ClientCredentialsToken(OAuthToken):
+    def __init__(self, domain, client_id, client_secret, **kwargs):
+        super().__init__(domain, **kwargs)
+        self.client_id = client_id
+        self.client_secret = client_secret
+
+    def _auth(self):
+        return (self.client_id, self.client_secret)
+
+    def _grant(self):
+        return {"grant_type": "client_credentials", "scope": self.scope}
+
+
+class JwtProfileToken(OAuthToken):
+    """Service-user key JSON: {"type": "serviceaccount", "keyId", "key", "userId"}."""
+
+    def __init__(self, domain, key_file, **kwargs):
+        super().__init__(domain, **kwargs)
+        if jwt is None:
+            raise RuntimeError("JWT-profile auth needs PyJWT + cryptography (pip install 'pyjwt[crypto]')")
+        with open(key_file, encoding="utf-8") as f:
+            key = json.load(f)
+        self.client_id = key["userId"]
+        self.key_id = key["keyId"]
+        self.private_key = key["key"]
+
+    def _grant(self):
+        now = int(time.time())
+        assertion = jwt.encode(
+            {"iss": self.client_id, "sub": self.client_id, "aud": self.domain, "iat": now, "exp": now + 300},
+            self.private_key, algorithm="RS256", headers={"kid": self.key_id},
+        )
+        return {
+            "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
+            "assertion": assertion,
+            "scope": self.scope,
+        }
+
+
+def auth_from_config(conf):
+    """
+    Pick the token source from a [zitadel] config section:
+    key_file -> JWT profile, client_id + client_secret -> client credentials,
+    otherwise the static access_token.
+    """
+    domain = conf["domain"]
+    kwargs = {
+        "scope": conf.get("scope", DEFAULT_SCOPE),
+        "cache_path": conf.get("token_cache", TOKEN_CACHE),
+    }
+    if conf.get("key_file"):
+        return JwtProfileToken(domain, conf["key_file"], **kwargs)
+    if conf.get("client_id") and conf.get("client_secret"):
+        return ClientCredentialsToken(domain, conf["client_id"], conf["client_secret"], **kwargs)
+    return StaticToken(conf.get("access_token", ""))
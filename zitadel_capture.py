@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Traffic capture for offline benchmarks.
+
+With ZITADEL_CAPTURE=run.jsonl (or ``capture = run.jsonl`` in zitadel.conf)
+every request a ZitadelClient sends is appended to a JSONL file: method,
+path, org header, request body, status, response body and timings. The
+Authorization header is never written, and the string value of every
+credential key (SECRET_KEYS: client secrets, passwords, private keys,
+token values) is replaced by "<scrubbed>" in both directions. Everything
+else -- flags, enums, metadata keys -- keeps its production shape. Pair with zitadel_replay.py to serve the capture back.
+
+Capturing reads each response body fully before handing it on, so
+streamed search parsing does not overlap the download while recording.
+"""
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+SCRUBBED = "<scrubbed>"
+SECRET_KEYS = frozenset((
+    "clientSecret", "client_secret", "secret",
+    "password", "initialPassword", "newPassword", "currentPassword",
+    "privateKey", "keyDetails",
+    "token", "accessToken", "access_token", "refreshToken", "refresh_token", "idToken", "id_token",
+    "clientAssertion", "client_assertion", "assertion",
+))
+
+
+def scrub(obj):
+    if isinstance(obj, dict):
+        return {k: SCRUBBED if k in SECRET_KEYS and isinstance(v, str) and v else scrub(v)
+                for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [scrub(v) for v in obj]
+    return obj
+
+
+def _body(content, content_type="application/json"):
+    if not content:
+        return None
+    if not content_type.startswith(("application/json", "text/")):
+        return {"_binary": len(content)}  # protobuf bodies can't be scrubbed, so they are not kept
+    try:
+        return scrub(json.loads(content))
+    except ValueError:
+        return {"_text": content.decode("utf-8", "replace")[:2000]}
+
+
+class _Buffered:
+    """A response whose body was read up front; iter_content replays it."""
+
+    def __init__(self, response, content):
+        self._r = response
+        self._content = content
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.content = content
+
+    def __getattr__(self, name):
+        return getattr(self._r, name)
+
+    def iter_content(self, chunk_size=65536):
+        for i in range(0, len(self._content), chunk_size):
+            yield self._content[i:i + chunk_size]
+
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class RecordingSession:
+    """Wraps a client session (requests or HTTP/2) and records every exchange."""
+
+    def __init__(self, session, recorder):
+        self._session = session
+        self.recorder = recorder
+        self.headers = session.headers
+
+    def request(self, method, url, json=None, headers=None, data=None, **kwargs):
+        start = time.perf_counter()
+        if data is not None:
+            kwargs["data"] = data
+        r = self._session.request(method, url, json=json, headers=headers, **kwargs)
+        ttfb = time.perf_counter() - start
+        content = r.content
+        total = time.perf_counter() - start
+        parts = urlsplit(url)
+        self.recorder.write({
+            "t": round(time.time() - self.recorder.started, 4),
+            "method": method,
+            "path": parts.path + (f"?{parts.query}" if parts.query else ""),
+            "org": (headers or {}).get("x-zitadel-orgid"),
+            "request": scrub(json) if json is not None else _body(data, (headers or {}).get("Content-Type", "")),
+            "status": r.status_code,
+            "content_type": r.headers.get("Content-Type", "application/json"),
+            "body": _body(content, r.headers.get("Content-Type", "application/json")),
+            "ttfb_ms": round(ttfb * 1000, 2),
+            "total_ms": round(total * 1000, 2),
+        })
+        return _Buffered(r, content)
+
+    def close(self):
+        self._session.close()
@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP client for the Zitadel scripts.
+
+Search pages are parsed incrementally: the items of the ``result`` array that
+have arrived with a chunk are decoded together and handed to the caller, so a
+page of 200 apps with full OIDC configs is never held as one big body + object
+tree. All decodes, search items included, go through json_loads(), which uses
+orjson when it is installed.
+
+Transport: a pooled requests.Session by default. With ZITADEL_TRANSPORT=http2
+(or ``transport = http2``) and httpx + h2 installed (``pip install
+'httpx[http2]'``) all requests of a client are multiplexed as HTTP/2 streams
+over one TLS connection instead; httpx errors are re-raised as the matching
+requests exceptions. Both ask for gzip-compressed responses.
+
+ZITADEL_CAPTURE=run.jsonl records every exchange, scrubbed, for offline
+replay (see zitadel_capture.py / zitadel_replay.py).
+
+ZITADEL_PROTOCOL=connect sends the v2 user / secret calls as Connect RPCs,
+binary protobuf when the stubs are installed (see zitadel_connect.py).
+
+Timeouts: idempotent reads (GETs, searches, List/Get RPCs) get a per-endpoint
+timeout derived from the latencies seen so far in the run, and one retry
+with the flat timeout when it fires. ZITADEL_HEDGE=1 (or ``hedge = true``)
+also re-sends a read that has not answered by that endpoint's p95 and uses
+whichever copy answers first. Writes -- secret rotations above all -- keep
+the flat timeout and are never hedged or retried.
+
+``rate_limit = N`` (or ZITADEL_RATE_LIMIT=N) paces every request against
+one budget of N requests/s per domain, shared and fair-shared by all the
+processes on the host (see zitadel_ratelimit.py).
+"""
+import configparser
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import zitadel_connect as connect
+from zitadel_auth import StaticToken, auth_from_config
+from zitadel_capture import Recorder, RecordingSession
+from zitadel_ratelimit import RATE_LIMIT, RATE_STATE, SharedRateLimit
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is used otherwise
+    orjson = None
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+except ImportError:  # optional, falls back to requests + HTTP/1.1 pooling
+    httpx = None
+
+TIMEOUT = 30
+PAGE_SIZE = 200
+CHUNK_SIZE = 64 * 1024
+TRANSPORT = os.environ.get("ZITADEL_TRANSPORT", "http1")  # http1 | http2 | auto (http2 when httpx is installed)
+MAX_CONNECTIONS = 32
+CAPTURE = os.environ.get("ZITADEL_CAPTURE", "")
+RESULT_KEYS = ("result", "projects", "apps", "users")
+HEDGE = os.environ.get("ZITADEL_HEDGE", "") not in ("", "0")
+LATENCY_WINDOW = 200    # samples kept per endpoint
+MIN_SAMPLES = 20        # below this the flat timeout is used and nothing is hedged
+TIMEOUT_FACTOR = 4      # adaptive timeout = p99 * factor ...
+MIN_TIMEOUT = 2.0       # ... but never below this
+
+DEFAULT_ORG = object()  # "use the client's org" marker for org_id arguments
+_ITEM_BOUNDARY = re.compile(rb"\}[ \t\n\r]*,[ \t\n\r]*\{")
+_ID_SEGMENT = re.compile(r"/(projects|apps|users|orgs|members|keys|pats|events)/(?!_)[^/?]+")
+_READ_RPC = re.compile(r"^/zitadel\.[\w.]+/(List|Get)\w*$")
+
+
+def json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_config(path="zitadel.conf", section="zitadel"):
+    cfg = configparser.ConfigParser()
+    cfg.read(path)
+    return cfg[section] if cfg.has_section(section) else {}
+
+
+class SearchPageParser:
+    """
+    Incremental parser for one search response body (bytes).
+
+    Finds the first top-level array under one of ``result_keys`` and, per
+    fed chunk, decodes all the items that have fully arrived with a single
+    json_loads() of the slice up to the last item boundary (``},{``); a
+    boundary that is really inside a string or a nested array just fails
+    to decode and the one before it is tried. Everything else (details,
+    nextPageToken, ...) is collected into ``envelope``.
+    """
+
+    def __init__(self, result_keys=RESULT_KEYS):
+        self.result_keys = result_keys
+        self.envelope = {}
+        self.result_key = None
+        self._result_re = re.compile(rb'"(' + b"|".join(re.escape(k.encode()) for k in result_keys)
+                                     + rb')"[ \t\n\r]*:[ \t\n\r]*\[')
+        self._buf = b""
+        self._scan = 0
+
+    def _find_result(self, buf):
+        """Offset of the result array's first item in ``buf``, None until it has arrived."""
+        for m in self._result_re.finditer(buf, self._scan):
+            head = buf[:m.start()].rstrip(b" \t\n\r")
+            if not head.startswith(b"{"):
+                raise ValueError(f"search response is not a JSON object: {buf[:80]!r}")
+            try:
+                # only a top-level key leaves a head that closes into an object
+                self.envelope.update(json_loads(head.rstrip(b",") + b"}"))
+            except ValueError:
+                continue
+            self.result_key = m.group(1).decode()
+            self.envelope[self.result_key] = []
+            return m.end()
+        self._scan = max(0, len(buf) - 64)  # a key cut off at the end is found on the next chunk
+        return None
+
+    def feed(self, data):
+        buf = self._buf + data
+        if self.result_key is None:
+            pos = self._find_result(buf)
+            if pos is None:
+                self._buf = buf
+                return []
+            buf = buf[pos:]
+        items, end = [], len(buf)
+        while True:
+            # the last boundary first: one decode for everything before it
+            end = buf.rfind(b"}", 0, end)
+            if end < 0:
+                break
+            m = _ITEM_BOUNDARY.match(buf, end)
+            if m is None:
+                continue
+            try:
+                items = json_loads(b"[" + buf[:end + 1] + b"]")
+            except ValueError:
+                continue
+            buf = buf[m.end() - 1:]
+            break
+        self._buf = buf
+        return items
+
+    def close(self):
+        """Items after the last boundary; the rest of the body goes into ``envelope``."""
+        if self.result_key is None:  # empty results are left out of the response
+            self.envelope.update(json_loads(self._buf))
+            return []
+        rest = json_loads(b'{"' + self.result_key.encode() + b'":[' + self._buf)
+        items = rest.pop(self.result_key)
+        self.envelope.update(rest)
+        return items
+
+
+@contextlib.contextmanager
+def _requests_errors():
+    """Re-raise httpx transport errors as the requests exceptions the scripts catch."""
+    try:
+        yield
+    except httpx.TimeoutException as e:
+        raise requests.Timeout(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.ConnectionError(str(e)) from e
+
+
+class _Http2Response:
+    """Gives an httpx response the parts of the requests.Response API we use."""
+
+    def __init__(self, response):
+        self._r = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.http_version = response.http_version
+
+    @property
+    def content(self):
+        with _requests_errors():
+            return self._r.read()
+
+    @property
+    def text(self):
+        with _requests_errors():
+            self._r.read()
+        return self._r.text
+
+    def json(self):
+        return json_loads(self.content)
+
+    def iter_content(self, chunk_size=CHUNK_SIZE):
+        with _requests_errors():
+            yield from self._r.iter_bytes(chunk_size)
+
+    def close(self):
+        self._r.close()
+
+    def raise_for_status(self):
+        # Scripts catch requests.HTTPError, so keep raising that type here.
+        if self.status_code >= 400:
+            with _requests_errors():
+                self._r.read()
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class _Http2Session:
+    """Minimal requests.Session look-alike on top of an HTTP/2 httpx.Client."""
+
+    def __init__(self, max_connections):
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client = httpx.Client(http2=True, limits=limits)
+        self.headers = self._client.headers
+
+    def request(self, method, url, json=None, headers=None, timeout=TIMEOUT, stream=False, data=None):
+        req = self._client.build_request(method, url, json=json, content=data, headers=headers, timeout=timeout)
+        with _requests_errors():
+            r = self._client.send(req, stream=True)
+            if not stream:
+                r.read()
+        return _Http2Response(r)
+
+    def close(self):
+        self._client.close()
+
+
+def make_session(transport=TRANSPORT, max_connections=MAX_CONNECTIONS):
+    """
+    HTTP/2 session when asked for ("http2", or "auto") and available, else a
+    requests.Session whose pool is sized for ``max_connections`` threads.
+    """
+    if transport in ("auto", "http2") and httpx is not None:
+        return _Http2Session(max_connections)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_connections)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class _RpcResponse:
+    """A Connect response whose json() decodes binary protobuf bodies too."""
+
+    def __init__(self, response, method):
+        self._r = response
+        self._method = method
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+    def __getattr__(self, name):
+        return getattr(self._r, name)
+
+    def json(self):
+        content = self._r.content
+        data = connect.decode(self._method, content, self.headers.get("Content-Type", ""))
+        if data is None:
+            data = json_loads(content) if content else {}
+        return data
+
+
+def endpoint_key(method, path):
+    """"POST /management/v1/projects/{id}/apps/_search": ids folded so samples add up."""
+    return f"{method} {_ID_SEGMENT.sub(lambda m: f'/{m.group(1)}/{{id}}', path.split('?')[0])}"
+
+
+def is_idempotent(method, path):
+    """Reads only: safe to time out early, retry and hedge."""
+    path = path.split("?")[0]
+    if method in ("GET", "HEAD"):
+        return True
+    return method == "POST" and (path.endswith("_search") or path == "/v2/users" or bool(_READ_RPC.match(path)))
+
+
+class LatencyTracker:
+    """Sliding window of response times per endpoint (time to response headers)."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self.window = window
+
+    def add(self, key, seconds):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, key, pct):
+        """None until the endpoint has MIN_SAMPLES samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(key) or ())
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def timeout(self, key, default):
+        p99 = self.percentile(key, 99)
+        return default if p99 is None else min(default, max(MIN_TIMEOUT, p99 * TIMEOUT_FACTOR))
+
+
+class SingleFlight:
+    """
+    Per-run memo for idempotent reads: the first caller of a key runs the
+    call, concurrent and later callers with the same key get its result.
+    Failures are not memoized. Long-lived processes clear() it per cycle.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            fut = self._calls.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._calls[key] = Future()
+        if owner:
+            try:
+                fut.set_result(fn())
+            except BaseException as e:
+                with self._lock:
+                    self._calls.pop(key, None)
+                fut.set_exception(e)
+        return fut.result()
+
+    def clear(self):
+        with self._lock:
+            self._calls.clear()
+
+
+class DeadlinePassed(requests.Timeout):
+    """A read that was not sent because ``client.deadline`` had already passed."""
+
+
+def _close_response(fut):
+    if fut.exception() is None:
+        fut.result().close()
+
+
+class ZitadelClient:
+    """Thin wrapper around one HTTP session bound to a Zitadel domain and org."""
+
+    def __init__(self, domain, access_token, org_id=None, timeout=TIMEOUT,
+                 transport=TRANSPORT, max_connections=MAX_CONNECTIONS, capture=CAPTURE,
+                 protocol=connect.PROTOCOL, hedge=HEDGE, rate_limit=RATE_LIMIT, rate_state=RATE_STATE):
+        """
+        ``access_token`` is a token string or a zitadel_auth token source;
+        ``capture`` is a JSONL path that records all traffic (scrubbed);
+        ``protocol="connect"`` routes the v2 calls that support it through rpc();
+        ``hedge`` duplicates slow idempotent reads (see the module docstring);
+        ``rate_limit`` (requests/s, 0 = off) is this domain's host-wide budget.
+        """
+        self.domain = domain.rstrip("/")
+        self.org_id = org_id
+        self.timeout = timeout
+        self.protocol = protocol
+        self.hedge = hedge
+        self.latency = LatencyTracker()
+        self.hedged = 0
+        self.deadline = None  # zitadel_deadline.Deadline: no reads are started after it
+        self.limiter = SharedRateLimit(self.domain, rate_limit, rate_state) if rate_limit else None
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max_connections) if hedge else None
+        self.auth = StaticToken(access_token) if isinstance(access_token, str) else access_token
+        self.session = make_session(transport, max_connections)
+        self.memo = SingleFlight()
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip",
+            "Content-Type": "application/json",
+        })
+        if capture:
+            self.session = RecordingSession(self.session, Recorder(capture))
+
+    @classmethod
+    def from_config(cls, path="zitadel.conf", **kwargs):
+        conf = load_config(path)
+        kwargs.setdefault("transport", conf.get("transport", TRANSPORT))
+        kwargs.setdefault("capture", conf.get("capture", CAPTURE))
+        kwargs.setdefault("protocol", conf.get("protocol", connect.PROTOCOL))
+        kwargs.setdefault("hedge", conf.get("hedge", str(HEDGE)).lower() in ("1", "true", "yes", "on"))
+        kwargs.setdefault("rate_limit", float(conf.get("rate_limit", RATE_LIMIT) or 0))
+        kwargs.setdefault("rate_state", conf.get("rate_state", RATE_STATE))
+        return cls(conf["domain"], auth_from_config(conf), conf.get("org_id"), **kwargs)
+
+    def close(self):
+        if self._hedge_pool:
+            self._hedge_pool.shutdown(wait=False)
+        if self.limiter:
+            self.limiter.close()
+        self.session.close()
+
+    def url(self, path):
+        return path if path.startswith(("http://", "https://")) else f"{self.domain}{path}"
+
+    def headers(self, org_id=DEFAULT_ORG):
+        org = self.org_id if org_id is DEFAULT_ORG else org_id
+        h = {"Authorization": f"Bearer {self.auth.token()}"}
+        if org:
+            h["x-zitadel-orgid"] = org
+        return h
+
+    # ----------------- plain requests -----------------
+    def _memo_key(self, kind, path, org_id, payload):
+        org = self.org_id if org_id is DEFAULT_ORG else org_id
+        return kind, self.url(path), org, json.dumps(payload, sort_keys=True)
+
+    def request(self, method, path, payload=None, org_id=DEFAULT_ORG, memo=False, **kwargs):
+        """
+        Send one request and return the response without raising on status.
+        A 401 drops the cached token and retries once with a freshly minted one.
+        ``memo=True`` (idempotent reads only) shares one call and its response
+        between identical requests of this run.
+        """
+        if memo:
+            return self.memo.do(self._memo_key(method, path, org_id, payload),
+                                lambda: self.request(method, path, payload, org_id=org_id, **kwargs))
+        key = endpoint_key(method, path)
+        if not is_idempotent(method, path):
+            kwargs.setdefault("timeout", self.timeout)
+            return self._send(key, method, path, payload, org_id, **kwargs)
+        if "timeout" in kwargs:
+            return self._send(key, method, path, payload, org_id, **kwargs)
+        if self.deadline is not None and self.deadline.expired():
+            raise DeadlinePassed(f"deadline passed, not sending {method} {path}")
+        timeout = self.latency.timeout(key, self.timeout)
+        try:
+            if self.hedge:
+                return self._hedged(key, lambda: self._send(key, method, path, payload, org_id, timeout=timeout,
+                                                            **kwargs))
+            return self._send(key, method, path, payload, org_id, timeout=timeout, **kwargs)
+        except requests.Timeout:
+            if timeout >= self.timeout or (self.deadline is not None and self.deadline.expired()):
+                raise
+            # a stall far beyond what this endpoint normally takes: one more try, flat timeout
+            return self._send(key, method, path, payload, org_id, timeout=self.timeout, **kwargs)
+
+    def _send(self, key, method, path, payload, org_id, **kwargs):
+        extra = kwargs.pop("headers", None) or {}
+        if self.limiter:
+            self.limiter.acquire()
+        start = time.perf_counter()
+        r = self.session.request(method, self.url(path), json=payload,
+                                 headers={**self.headers(org_id), **extra}, **kwargs)
+        if r.status_code == 401 and not isinstance(self.auth, StaticToken):
+            r.close()
+            self.auth.invalidate()
+            if self.limiter:
+                self.limiter.acquire()
+            start = time.perf_counter()
+            r = self.session.request(method, self.url(path), json=payload,
+                                     headers={**self.headers(org_id), **extra}, **kwargs)
+        if r.status_code < 500:
+            self.latency.add(key, time.perf_counter() - start)
+        return r
+
+    def _hedged(self, key, send):
+        """send(), plus a second copy if the first has not answered by the endpoint's p95."""
+        delay = self.latency.percentile(key, 95)
+        if delay is None:
+            return send()
+        first = self._hedge_pool.submit(send)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        self.hedged += 1
+        pending = {first, self._hedge_pool.submit(send)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winners = [fut for fut in done if fut.exception() is None]
+            if winners:
+                for loser in [*winners[1:], *pending]:
+                    loser.add_done_callback(_close_response)
+                return winners[0].result()
+            error = error or next(iter(done)).exception()
+        raise error
+
+    def call(self, method, path, payload=None, org_id=DEFAULT_ORG, memo=False):
+        r = self.request(method, path, payload, org_id=org_id, memo=memo)
+        r.raise_for_status()
+        return json_loads(r.content) if r.content else {}
+
+    def get(self, path, org_id=DEFAULT_ORG, memo=False):
+        return self.call("GET", path, org_id=org_id, memo=memo)
+
+    def post(self, path, payload=None, org_id=DEFAULT_ORG):
+        return self.call("POST", path, {} if payload is None else payload, org_id=org_id)
+
+    def put(self, path, payload=None, org_id=DEFAULT_ORG):
+        return self.call("PUT", path, {} if payload is None else payload, org_id=org_id)
+
+    def delete(self, path, org_id=DEFAULT_ORG):
+        return self.call("DELETE", path, org_id=org_id)
+
+    # ----------------- Connect RPCs (v2 services) -----------------
+    def rpc_request(self, method, payload, org_id=DEFAULT_ORG, memo=False):
+        """
+        One Connect unary call ("zitadel.user.v2.UserService/GetUserByID"),
+        returned without raising on status; ``r.json()`` decodes either
+        encoding. A 415 for application/proto switches the method to JSON.
+        """
+        if memo:
+            return self.memo.do(self._memo_key("RPC", method, org_id, payload),
+                                lambda: self.rpc_request(method, payload, org_id))
+        headers = {"Connect-Protocol-Version": "1"}
+        body, content_type = connect.encode(method, payload)
+        if content_type == connect.PROTO:
+            r = self.request("POST", f"/{method}", data=body, org_id=org_id,
+                             headers={**headers, "Content-Type": content_type})
+            if r.status_code != 415:
+                return _RpcResponse(r, method)
+            r.close()
+            connect.disable_binary(method)
+        return _RpcResponse(self.request("POST", f"/{method}", payload, org_id=org_id, headers=headers), method)
+
+    def rpc(self, method, payload=None, org_id=DEFAULT_ORG):
+        r = self.rpc_request(method, {} if payload is None else payload, org_id=org_id)
+        r.raise_for_status()
+        return r.json()
+
+    # ----------------- streamed search -----------------
+    def search_page(self, path, payload, result_keys=RESULT_KEYS, org_id=DEFAULT_ORG):
+        """
+        Yield the items of one search page as they are decoded.
+        Returns the page envelope (everything except the items) via StopIteration.
+        """
+        r = self.request("POST", path, payload, org_id=org_id, stream=True)
+        try:
+            r.raise_for_status()
+            parser = SearchPageParser(result_keys)
+            for chunk in r.iter_content(CHUNK_SIZE):
+                yield from parser.feed(chunk)
+            yield from parser.close()
+        finally:
+            r.close()
+        return parser.envelope
+
+    def search(self, path, queries=None, result_keys=RESULT_KEYS, limit=PAGE_SIZE, org_id=DEFAULT_ORG, v2=False,
+               memo=False, rpc=None):
+        """
+        Yield every item of an offset-paginated search endpoint: v1 ``_search``
+        bodies carry limit/offset at the top level, v2 list calls under "query".
+        With ``memo=True`` the full listing is fetched once per run and shared
+        (treat the items as read-only). ``rpc`` names the equivalent Connect
+        method, used instead of ``path`` when the client speaks Connect.
+        """
+        if memo:
+            key = self._memo_key("SEARCH", path, org_id, [queries, limit, v2, list(result_keys)])
+            yield from self.memo.do(key, lambda: list(self.search(path, queries, result_keys, limit, org_id, v2,
+                                                                  rpc=rpc)))
+            return
+        offset = 0
+        while True:
+            if v2:
+                payload = {"query": {"offset": offset, "limit": limit, "asc": True}, "queries": queries or []}
+            else:
+                payload = {"limit": limit, "offset": offset, "asc": True, "queries": queries or []}
+            if rpc and self.protocol == "connect":
+                page = self.rpc(rpc, payload, org_id=org_id)
+                items = next((page[k] for k in result_keys if k in page), [])
+            else:
+                items = self.search_page(path, payload, result_keys, org_id=org_id)
+            count = 0
+            for item in items:
+                count += 1
+                yield item
+            if count < limit:
+                return
+            offset += count
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Run deadlines for jobs with a fixed cron window.
+
+``--deadline 20m`` gives the whole run a time budget. Phases take a share
+of what is left (Deadline.share) so a slow listing cannot eat the time the
+next phase needs; work is only *started* while the budget lasts and
+requests already in flight are allowed to finish with their normal
+timeout. A client with ``client.deadline`` set does not start reads (or
+retries) once it has passed. The scripts then write what they have,
+marked incomplete, with a resume point.
+"""
+import math
+import time
+
+PARTIAL_EXIT = 5     # exit code of a run that wrote partial output
+
+
+def parse_duration(text):
+    """"90", "90s", "20m", "1h" -> seconds."""
+    text = text.strip().lower()
+    unit = {"s": 1, "m": 60, "h": 3600}.get(text[-1:])
+    return float(text[:-1]) * unit if unit else float(text)
+
+
+class Deadline:
+    """End of a time budget on the monotonic clock; ``Deadline()`` never expires."""
+
+    def __init__(self, seconds=None, end=None):
+        self.end = end if end is not None else (None if seconds is None else time.monotonic() + seconds)
+
+    def remaining(self):
+        return math.inf if self.end is None else self.end - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def share(self, fraction):
+        """A deadline for one phase: ``fraction`` of the time left, never past this one."""
+        if self.end is None:
+            return Deadline()
+        return Deadline(end=time.monotonic() + max(0.0, self.remaining()) * fraction)
+
+
+def add_deadline_arg(ap):
+    ap.add_argument("--deadline", type=parse_duration, metavar="DURATION",
+                    help="time budget for the run (90s, 20m, 1h); writes partial output when it runs out")
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Keep an Inventory current from Zitadel's event feed instead of re-crawling.
+
+EventFollower reads /admin/v1/events/_search for the project and user
+aggregates from a stored position and folds the events into the inventory.
+Sequences only count within one aggregate, so the position is the
+creation date of the last event read plus the (aggregate, sequence) keys
+already seen at that instant: the next read starts at that date and drops
+just those.
+Removals are applied directly; creates and changes only mark the resource
+dirty. Each dirty project, app or user is then re-read once per poll with a
+single GET, so a burst of config events for one app costs one request. The
+position is saved to a small JSON file after every poll.
+
+The feed covers the whole instance; only events owned by the crawled orgs
+(inventory.orgs after an all-orgs crawl, else the client's org) are applied.
+
+A poll with events applies them to a copy of the inventory and then
+replaces ``follower.inventory`` in one assignment, so readers holding the
+previous inventory never see it change under them.
+
+    ./zitadel_events.py --once              # crawl, apply what happened meanwhile, exit
+    ./inventory_daemon.py --events          # daemon: event polls instead of periodic crawls
+
+Reading the feed needs IAM-level (admin) read permission. Call head()
+before the initial crawl so no event between crawl and first poll is lost;
+replaying an already-seen event is harmless.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import requests
+
+from zitadel_client import ZitadelClient, json_loads
+from zitadel_inventory import crawl
+from zitadel_profile import phase, profile_main
+from zitadel_rotation import _extract_user, _is_machine
+
+EVENTS = "/admin/v1/events/_search"
+EVENT_PAGE = 500
+STATE_FILE = "inventory_events.json"
+AGGREGATES = ["project", "user"]
+POLL_INTERVAL = 60
+
+
+def _type(value):
+    """Event and aggregate types come as "x" or {"type": "x", "localized": ...}."""
+    return (value.get("type") if isinstance(value, dict) else value) or ""
+
+
+def _key(event):
+    agg = event.get("aggregate") or {}
+    return f"{_type(agg.get('type'))}:{agg.get('id') or ''}:{event.get('sequence') or ''}"
+
+
+def advance(position, events):
+    """Position after ``events`` (ascending): last creation date + the keys seen at it."""
+    position = {"since": position["since"], "seen": list(position["seen"])}
+    for e in events:
+        date = e.get("creationDate") or ""
+        if date != position["since"]:
+            position = {"since": date, "seen": []}
+        position["seen"].append(_key(e))
+    return position
+
+
+def fetch_events(client, position, limit=EVENT_PAGE):
+    """(events after ``position``, size of the page read); position None reads from the start."""
+    body = {"limit": limit, "asc": True, "aggregateTypes": AGGREGATES}
+    if position and position["since"]:
+        body["creationDate"] = position["since"]
+    events = client.post(EVENTS, body, org_id=None).get("events") or []
+    seen = set(position["seen"]) if position else set()
+    return [e for e in events if _key(e) not in seen], len(events)
+
+
+def head(client):
+    """Position of the newest project/user event ({"since": "", ...} if there is none)."""
+    body = {"limit": 1, "asc": False, "aggregateTypes": AGGREGATES}
+    events = client.post(EVENTS, body, org_id=None).get("events") or []
+    return advance({"since": "", "seen": []}, events)
+
+
+class EventFollower:
+    def __init__(self, client, inventory, state_file=STATE_FILE, orgs=None):
+        self.client = client
+        self.inventory = inventory
+        self.state_file = state_file
+        # resource owners whose events apply; None (client without an org id) keeps all
+        if orgs is None:
+            orgs = set(inventory.orgs) or ({client.org_id} if client.org_id else None)
+        self.orgs = orgs
+        self.position = None  # None: no usable state, start from head() after a crawl
+        if os.path.exists(state_file):
+            with open(state_file, encoding="utf-8") as f:
+                state = json.load(f)
+            if "since" in state:  # older files only had a global sequence
+                self.position = {"since": state["since"], "seen": list(state.get("seen") or [])}
+
+    def save(self):
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.position, f)
+        os.replace(tmp, self.state_file)
+
+    def poll(self):
+        """Apply everything after the stored position; returns the number of events seen."""
+        seen, position = 0, self.position
+        dirty_projects, dirty_apps, dirty_users = {}, {}, {}
+        inv, limit = None, EVENT_PAGE
+        while True:
+            events, read = fetch_events(self.client, position, limit)
+            if events and inv is None:
+                inv = self.inventory.copy()
+            for e in events:
+                self._classify(inv, e, dirty_projects, dirty_apps, dirty_users)
+            position = advance(position or {"since": "", "seen": []}, events)
+            seen += len(events)
+            if read < limit:
+                break
+            if not events:
+                # a full page of events already seen: they all share one creation date
+                # and the feed has no offset, so read further into that instant
+                limit *= 2
+        # only move the position once the refetches went through, so a failed
+        # poll is simply repeated next time
+        if inv is not None:
+            self._refetch(inv, dirty_projects, dirty_apps, dirty_users)
+            self.inventory = inv
+        self.position = position
+        self.save()
+        return seen
+
+    def _classify(self, inv, e, dirty_projects, dirty_apps, dirty_users):
+        kind = _type(e.get("type"))
+        agg = e.get("aggregate") or {}
+        agg_id, owner = agg.get("id") or "", agg.get("resourceOwner") or ""
+        if self.orgs is not None and owner not in self.orgs:
+            return
+        payload = e.get("payload") or {}
+        if kind.startswith("project.application."):
+            app_id = payload.get("appId") or ""
+            if kind == "project.application.removed":
+                dirty_apps.pop(app_id, None)
+                inv.remove_app(app_id)
+            elif app_id:
+                dirty_apps[app_id] = (agg_id, owner)
+        elif kind.startswith("project.") and "." not in kind[len("project."):]:
+            if kind == "project.removed":
+                dirty_projects.pop(agg_id, None)
+                inv.remove_project(agg_id)
+            else:
+                dirty_projects[agg_id] = owner
+        elif kind.startswith("user.") and _type(agg.get("type")) == "user":
+            if kind in ("user.removed", "user.machine.removed"):
+                dirty_users.pop(agg_id, None)
+                inv.remove_user(agg_id)
+            elif agg_id in inv.users or kind.startswith("user.machine."):
+                dirty_users[agg_id] = owner  # humans are not tracked
+
+    def _refetch(self, inv, dirty_projects, dirty_apps, dirty_users):
+        for pid, owner in dirty_projects.items():
+            r = self.client.request("GET", f"/management/v1/projects/{pid}", org_id=owner or None)
+            if r.status_code == 404:
+                inv.remove_project(pid)
+            else:
+                r.raise_for_status()
+                inv.add_project(json_loads(r.content).get("project") or {}, owner)
+        for app_id, (pid, owner) in dirty_apps.items():
+            r = self.client.request("GET", f"/management/v1/projects/{pid}/apps/{app_id}", org_id=owner or None)
+            if r.status_code == 404:
+                inv.remove_app(app_id)
+            else:
+                r.raise_for_status()
+                inv.add_app(pid, json_loads(r.content).get("app") or {})
+                inv.project_org.setdefault(pid, owner)
+        for user_id, owner in dirty_users.items():
+            r = self.client.request("GET", f"/v2/users/{user_id}", org_id=owner or None)
+            if r.status_code == 404:
+                inv.remove_user(user_id)
+            else:
+                r.raise_for_status()
+                payload = json_loads(r.content)
+                user = dict(_extract_user(payload))
+                user.setdefault("details", payload.get("details") or {})
+                if _is_machine(user):
+                    inv.add_user(user)
+        for name, dirty in (("projects", dirty_projects), ("apps", dirty_apps), ("users", dirty_users)):
+            if dirty:
+                print(f"# events: refreshed {len(dirty)} {name}", file=sys.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Crawl once, then follow Zitadel's event feed.")
+    ap.add_argument("--config", default="zitadel.conf")
+    ap.add_argument("--state", default=STATE_FILE)
+    ap.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between event polls")
+    ap.add_argument("--once", action="store_true", help="poll once after the crawl and exit")
+    args = ap.parse_args()
+
+    client = ZitadelClient.from_config(args.config)
+    with phase("event head"):
+        start = head(client)
+    with phase("crawl"):
+        inv = crawl(client)
+    follower = EventFollower(client, inv, args.state)
+    if follower.position is None:
+        follower.position = start
+    while True:
+        n = follower.poll()
+        print(f"# {n} events, up to {follower.position['since'] or '-'}: {follower.inventory.stats()}",
+              file=sys.stderr)
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    try:
+        profile_main(main)
+    except requests.HTTPError as e:
+        print("HTTP error:", getattr(e.response, "text", str(e)), file=sys.stderr)
+        sys.exit(2)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print("Error:", e, file=sys.stderr)
+        sys.exit(3)
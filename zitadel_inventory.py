@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+In-memory inventory of projects, apps and service (machine) users, indexed
+for the lookups the scripts keep re-crawling for: app -> project,
+client_id -> app or service user, username -> user, and redirect /
+post-logout URI or URI host -> apps.
+"""
+import bisect
+import fnmatch
+import functools
+import sys
+import time
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from zitadel_client import DEFAULT_ORG
+from zitadel_connect import USER_SERVICE
+from zitadel_deadline import Deadline
+from zitadel_profile import phase
+
+WORKERS = 8
+MACHINE_QUERY = {"typeQuery": {"type": "TYPE_MACHINE"}}
+LIST_USERS = f"{USER_SERVICE}/ListUsers"  # Connect equivalent of POST /v2/users
+RESOLVE_BATCH = 50
+
+
+# ----------------- field helpers (same tolerance as the scripts) -----------------
+def extract(d, *keys):
+    for k in keys:
+        if isinstance(k, (list, tuple)):
+            cur = d
+            ok = True
+            for part in k:
+                if isinstance(cur, dict) and part in cur:
+                    cur = cur[part]
+                else:
+                    ok = False
+                    break
+            if ok:
+                return cur
+        else:
+            if isinstance(d, dict) and k in d:
+                return d[k]
+    return None
+
+def pick_client_id_from_app(app):
+    return (
+        extract(app, ["oidcConfig","clientId"]) or
+        extract(app, ["apiConfig","clientId"]) or
+        extract(app, "clientId") or
+        ""
+    )
+
+def app_type_label(app):
+    t = (app.get("appType") or app.get("type") or "").upper()
+    if "OIDC" in t: return "OIDC"
+    if "API"  in t: return "API"
+    if "oidcConfig" in app: return "OIDC"
+    if "apiConfig"  in app: return "API"
+    return t or "UNKNOWN"
+
+def app_uris(app):
+    """[(uri, kind)] of an OIDC app, kind "redirect" or "post_logout"."""
+    cfg = app.get("oidcConfig") or {}
+    return ([(u, "redirect") for u in cfg.get("redirectUris") or ()] +
+            [(u, "post_logout") for u in cfg.get("postLogoutRedirectUris") or ()])
+
+@functools.lru_cache(maxsize=65536)  # the same URIs repeat across many apps
+def uri_host(uri):
+    try:
+        return (urlsplit(uri).hostname or "").lower()
+    except ValueError:
+        return ""
+
+def service_user_fields(u):
+    user_id = extract(u, "userId", "user_id", "id") or ""
+    username = extract(u, "username", "userName") or ""
+    display = (
+        extract(u, "displayName") or
+        extract(u, ["profile","displayName"]) or
+        username or user_id
+    )
+    client_id = username or user_id
+    return user_id, username, display, client_id
+
+
+# ----------------- listing -----------------
+def list_projects(client, **kwargs):
+    return client.search("/management/v1/projects/_search", result_keys=("result", "projects"), **kwargs)
+
+def list_apps(client, project_id, **kwargs):
+    return client.search(f"/management/v1/projects/{project_id}/apps/_search", result_keys=("result", "apps"), **kwargs)
+
+def list_service_users(client, org_id=DEFAULT_ORG, extra_queries=(), **kwargs):
+    queries = [MACHINE_QUERY, *extra_queries]
+    if org_id is not DEFAULT_ORG and org_id:
+        # v2 ListUsers spans every org the token can see; scope it explicitly
+        queries.append({"organizationIdQuery": {"organizationId": org_id}})
+    return client.search("/v2/users", queries, result_keys=("result", "users"), v2=True, org_id=org_id,
+                         rpc=LIST_USERS, **kwargs)
+
+def find_service_user(client, username_or_id, org_id=None):
+    """One filtered v2 search for a machine user by username or userId (no full listing)."""
+    match = {"orQuery": {"queries": [
+        {"userNameQuery": {"userName": username_or_id, "method": "TEXT_QUERY_METHOD_EQUALS"}},
+        {"inUserIdsQuery": {"userIds": [username_or_id]}},
+    ]}}
+    users = client.search("/v2/users", [MACHINE_QUERY, match], result_keys=("result", "users"), v2=True,
+                          org_id=org_id, rpc=LIST_USERS)
+    return next(iter(users), None)
+
+def resolve_service_users(client, keys, batch=RESOLVE_BATCH):
+    """
+    {username or userId: machine user} for many users at once: one v2 search
+    per ``batch`` keys across every visible org, each user carrying its
+    details.resourceOwner. Keys that match nothing are missing from the result.
+    """
+    keys = list(dict.fromkeys(k for k in keys if k))
+    found = {}
+    for i in range(0, len(keys), batch):
+        chunk = keys[i:i + batch]
+        match = {"orQuery": {"queries": [
+            {"inUserIdsQuery": {"userIds": chunk}},
+            *({"userNameQuery": {"userName": k, "method": "TEXT_QUERY_METHOD_EQUALS"}} for k in chunk),
+        ]}}
+        for u in client.search("/v2/users", [MACHINE_QUERY, match], result_keys=("result", "users"), v2=True,
+                               org_id=None, rpc=LIST_USERS):
+            user_id, username, _, _ = service_user_fields(u)
+            for k in (user_id, username):
+                if k in chunk:
+                    found[k] = u
+    return found
+
+def list_orgs(client):
+    """Orgs visible to the token: v2 OrganizationService, else admin v1 (IAM roles)."""
+    try:
+        return list(client.search("/v2/organizations/_search", result_keys=("result",), org_id=None, v2=True))
+    except requests.HTTPError as e:
+        if getattr(e.response, "status_code", None) not in (403, 404, 405, 501):
+            raise
+    return list(client.search("/admin/v1/orgs/_search", result_keys=("result",), org_id=None))
+
+
+# ----------------- filters (pushed down into the search queries) -----------------
+def text_query(pattern):
+    """
+    fnmatch pattern -> (value, TEXT_QUERY_METHOD_*) when the server can
+    evaluate it: "x" equals, "x*" starts with, "*x" ends with, "*x*"
+    contains. Anything else (?, [..], inner *) is left to local matching.
+    """
+    core = pattern.strip("*")
+    if not core or any(c in core for c in "*?["):
+        return None
+    method = {(False, False): "EQUALS", (False, True): "STARTS_WITH",
+              (True, False): "ENDS_WITH", (True, True): "CONTAINS"}[pattern.startswith("*"), pattern.endswith("*")]
+    return core, f"TEXT_QUERY_METHOD_{method}"
+
+
+class SearchFilter:
+    """
+    CLI filters for targeted runs. Whatever the search APIs support becomes
+    part of the request (nameQuery, userNameQuery, stateQuery, org header /
+    organizationIdQuery); the rest -- app type, patterns the server cannot
+    express -- is checked locally with match_*().
+    """
+
+    def __init__(self, project_name=None, app_name=None, app_type=None, username=None, org_ids=(),
+                 user_state=None):
+        self.project_name = project_name
+        self.app_name = app_name
+        self.app_type = app_type.upper() if app_type else None
+        self.username = username
+        self.org_ids = list(org_ids or ())
+        state = (user_state or "").upper()
+        self.user_state = (state if state.startswith("USER_STATE_") else f"USER_STATE_{state}") if state else None
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(args.project, args.app, args.app_type, args.username,
+                   [o for o in (args.org or "").split(",") if o], args.user_state)
+
+    def __bool__(self):
+        return any((self.project_name, self.app_name, self.app_type, self.username, self.org_ids, self.user_state))
+
+    @property
+    def wants_apps(self):
+        """False when only user filters are set: skip the project/app crawl."""
+        return bool(self.project_name or self.app_name or self.app_type) or not (self.username or self.user_state)
+
+    @property
+    def wants_users(self):
+        return bool(self.username or self.user_state) or not (self.project_name or self.app_name or self.app_type)
+
+    @staticmethod
+    def _name_query(key, pattern):
+        q = text_query(pattern) if pattern else None
+        return [{key: {"name" if key == "nameQuery" else "userName": q[0], "method": q[1]}}] if q else []
+
+    def project_queries(self):
+        return self._name_query("nameQuery", self.project_name)
+
+    def app_queries(self):
+        return self._name_query("nameQuery", self.app_name)
+
+    def user_queries(self):
+        queries = self._name_query("userNameQuery", self.username)
+        if self.user_state:
+            queries.append({"stateQuery": {"state": self.user_state}})
+        return queries
+
+    def match_project(self, project):
+        return not self.project_name or fnmatch.fnmatchcase(project.get("name") or "", self.project_name)
+
+    def match_app(self, app):
+        if self.app_name and not fnmatch.fnmatchcase(app.get("name") or "", self.app_name):
+            return False
+        return not self.app_type or app_type_label(app) == self.app_type
+
+    def match_user(self, user):
+        _, username, _, _ = service_user_fields(user)
+        if self.username and not fnmatch.fnmatchcase(username, self.username):
+            return False
+        return not self.user_state or (user.get("state") or "") == self.user_state
+
+
+def add_filter_args(ap):
+    g = ap.add_argument_group("filters", "fnmatch patterns; pushed into the Zitadel search where supported")
+    g.add_argument("--project", help="project name")
+    g.add_argument("--app", help="app name")
+    g.add_argument("--app-type", choices=("OIDC", "API", "SAML"), type=str.upper)
+    g.add_argument("--username", help="service user username")
+    g.add_argument("--org", help="org id(s), comma separated")
+    g.add_argument("--user-state", help="active, inactive, locked, ...")
+
+
+class Inventory:
+    def __init__(self):
+        self.orgs = {}               # org_id -> org (all-orgs crawls only)
+        self.projects = {}           # project_id -> project
+        self.project_org = {}        # project_id -> org_id
+        self.apps = {}               # app_id -> app
+        self.app_project = {}        # app_id -> project_id
+        self.apps_by_client_id = {}  # client_id -> app_id
+        self.users = {}              # user_id -> user
+        self.users_by_name = {}      # username -> user_id
+        self.uris = {}               # redirect / post-logout URI -> {(app_id, kind)}
+        self.hosts = {}              # URI host -> {app_id}
+        self._sorted = {}            # "uris" / "hosts" -> sorted keys for prefix queries
+        self.loaded_at = None
+        # listings a deadline cut off (see crawl()); JSON-safe, "" = the client's org
+        self.pending = {"project_orgs": [], "projects": [], "user_orgs": []}
+
+    @property
+    def complete(self):
+        return not any(self.pending.values())
+
+    def copy(self):
+        """
+        An independent copy to change while readers keep using this one.
+        Resources are replaced, never edited in place, so they are shared;
+        the index sets are copied.
+        """
+        inv = Inventory()
+        for name in ("orgs", "projects", "project_org", "apps", "app_project", "apps_by_client_id", "users",
+                     "users_by_name"):
+            setattr(inv, name, dict(getattr(self, name)))
+        inv.uris = {k: set(v) for k, v in self.uris.items()}
+        inv.hosts = {k: set(v) for k, v in self.hosts.items()}
+        inv.loaded_at = self.loaded_at
+        inv.pending = {k: list(v) for k, v in self.pending.items()}
+        return inv
+
+    def add_project(self, project, org_id=None):
+        pid = project.get("id") or project.get("projectId") or ""
+        self.projects[pid] = project
+        self.project_org[pid] = org_id or extract(project, ["details", "resourceOwner"]) or ""
+        return pid
+
+    def add_app(self, project_id, app):
+        app_id = app.get("id") or ""
+        if app_id in self.apps:
+            self._unindex_uris(app_id, self.apps[app_id])
+        self.apps[app_id] = app
+        self._index_uris(app_id, app)
+        self.app_project[app_id] = project_id
+        client_id = str(pick_client_id_from_app(app) or "")
+        if client_id:
+            self.apps_by_client_id[client_id] = app_id
+
+    def add_user(self, user):
+        user_id, username, _, _ = service_user_fields(user)
+        self.users[user_id] = user
+        if username:
+            self.users_by_name[username] = user_id
+
+    def _index_uris(self, app_id, app):
+        for uri, kind in app_uris(app):
+            self.uris.setdefault(uri, set()).add((app_id, kind))
+            self.hosts.setdefault(uri_host(uri), set()).add(app_id)
+        self._sorted.clear()
+
+    def _unindex_uris(self, app_id, app):
+        for uri, kind in app_uris(app):
+            for index, key, value in ((self.uris, uri, (app_id, kind)), (self.hosts, uri_host(uri), app_id)):
+                entry = index.get(key)
+                if entry is not None:
+                    entry.discard(value)
+                    if not entry:
+                        del index[key]
+        self._sorted.clear()
+
+    def _prefixed(self, name, prefix):
+        keys = self._sorted.get(name)
+        if keys is None:
+            keys = self._sorted[name] = sorted(getattr(self, name))
+        i = bisect.bisect_left(keys, prefix)
+        out = []
+        while i < len(keys) and keys[i].startswith(prefix):
+            out.append(keys[i])
+            i += 1
+        return out
+
+    def apps_for_uri(self, uri):
+        """[(app_id, kind)] registering exactly this redirect / post-logout URI."""
+        return sorted(self.uris.get(uri) or ())
+
+    def apps_for_uri_prefix(self, prefix):
+        """[(uri, app_id, kind)] for every URI starting with ``prefix``."""
+        return [(uri, app_id, kind)
+                for uri in self._prefixed("uris", prefix) for app_id, kind in sorted(self.uris[uri])]
+
+    def apps_for_host(self, host):
+        """{host: [app_id]} for ``host``, or for every host starting with it when it ends in "*"."""
+        host = host.lower()
+        hosts = self._prefixed("hosts", host[:-1]) if host.endswith("*") else [host] if host in self.hosts else []
+        return {h: sorted(self.hosts[h]) for h in hosts}
+
+    def app_ref(self, app_id):
+        """Short description of an app for index answers."""
+        app = self.apps.get(app_id) or {}
+        return {"app_id": app_id, "name": app.get("name") or "", "project_id": self.app_project.get(app_id) or "",
+                "client_id": str(pick_client_id_from_app(app) or "")}
+
+    def remove_app(self, app_id):
+        app = self.apps.pop(app_id, None)
+        if app is not None:
+            self._unindex_uris(app_id, app)
+        self.app_project.pop(app_id, None)
+        client_id = str(pick_client_id_from_app(app or {}) or "")
+        if self.apps_by_client_id.get(client_id) == app_id:
+            del self.apps_by_client_id[client_id]
+
+    def remove_project(self, project_id):
+        for app_id in [a for a, p in self.app_project.items() if p == project_id]:
+            self.remove_app(app_id)
+        self.projects.pop(project_id, None)
+        self.project_org.pop(project_id, None)
+
+    def remove_user(self, user_id):
+        user = self.users.pop(user_id, None)
+        _, username, _, _ = service_user_fields(user or {})
+        if self.users_by_name.get(username) == user_id:
+            del self.users_by_name[username]
+
+    def find_project_for_app(self, app_id):
+        return self.app_project.get(app_id)
+
+    def org_for_app(self, app_id):
+        return self.project_org.get(self.app_project.get(app_id))
+
+    def org_for_user(self, user_id):
+        return extract(self.users.get(user_id) or {}, ["details", "resourceOwner"]) or ""
+
+    def find_user(self, id_or_username):
+        user_id = id_or_username if id_or_username in self.users else self.users_by_name.get(id_or_username)
+        return self.users.get(user_id)
+
+    def find_client(self, client_id):
+        """
+        Resolve a client_id the way the rotation scripts do: an app's
+        clientId first, then a service user's username or userId.
+        Returns ("APP", project_id, app), ("SERVICE_USER", None, user) or None.
+        """
+        client_id = str(client_id)
+        app_id = self.apps_by_client_id.get(client_id)
+        if app_id:
+            return "APP", self.app_project[app_id], self.apps[app_id]
+        user = self.find_user(client_id)
+        if user:
+            return "SERVICE_USER", None, user
+        return None
+
+    def stats(self):
+        return {
+            "orgs": len(self.orgs) or len(set(self.project_org.values())),
+            "projects": len(self.projects),
+            "apps": len(self.apps),
+            "service_users": len(self.users),
+            "loaded_at": self.loaded_at,
+        }
+
+
+def _org_out(org):
+    return "" if org is DEFAULT_ORG else org
+
+def _org_in(org):
+    return DEFAULT_ORG if org == "" else org
+
+
+def crawl(client, with_users=True, workers=WORKERS, orgs=None, filters=None, deadline=None, resume=None):
+    """
+    Full crawl into a fresh Inventory. Without ``orgs`` only the client's org
+    is crawled; with a list of org objects (see list_orgs()) every org is
+    crawled with its own x-zitadel-orgid header. Listing calls for all orgs
+    and projects share one pool, so a many-org instance is one parallel run.
+    A SearchFilter narrows the crawl server-side and then locally.
+
+    With a ``deadline`` (zitadel_deadline.Deadline) no listing is started
+    once it has passed; what was skipped ends up in ``inv.pending`` and
+    can be handed back as ``resume`` to crawl only that part.
+    """
+    inv = Inventory()
+    filters = filters or SearchFilter()
+    deadline = deadline or Deadline()
+    if orgs is None and filters.org_ids:
+        orgs = [{"id": o} for o in filters.org_ids]
+    elif orgs is not None and filters.org_ids:
+        orgs = [o for o in orgs if o.get("id") in filters.org_ids]
+    if orgs is None:
+        org_ids = [DEFAULT_ORG]
+    else:
+        inv.orgs = {o.get("id"): o for o in orgs}
+        org_ids = list(inv.orgs)
+
+    project_orgs = org_ids if filters.wants_apps else []
+    user_orgs = org_ids if with_users and filters.wants_users else []
+    pairs = []
+    if resume is not None:
+        project_orgs = [_org_in(o) for o in resume.get("project_orgs") or ()]
+        user_orgs = [_org_in(o) for o in resume.get("user_orgs") or ()]
+        for org, project in resume.get("projects") or ():
+            pairs.append((_org_in(org), inv.add_project(project, org or None)))
+    # project listing may use a quarter of the budget; app and user listings the rest
+    project_deadline = deadline.share(0.25)
+
+    def _bounded(until, listing):
+        """list(listing()), or None when ``until`` passed before or during it."""
+        if until.expired():
+            return None
+        try:
+            return list(listing())
+        except (requests.Timeout, requests.ConnectionError):
+            # a later page not started (DeadlinePassed) or a read that broke off
+            # after the deadline: leave the listing for the resume run
+            if until.expired():
+                return None
+            raise
+
+    def _projects(org):
+        try:
+            projects = _bounded(project_deadline,
+                                lambda: list_projects(client, queries=filters.project_queries(), org_id=org))
+        except requests.HTTPError as e:
+            print(f"# warn: listing projects failed for org {org}: {e}", file=sys.stderr)
+            projects = []
+        return org, projects
+
+    def _apps(org, pid):
+        try:
+            apps = _bounded(deadline, lambda: list_apps(client, pid, queries=filters.app_queries(), org_id=org))
+        except requests.HTTPError as e:
+            print(f"# warn: listing apps failed for project {pid}: {e}", file=sys.stderr)
+            apps = []
+        return org, pid, apps
+
+    def _users(org):
+        return _bounded(deadline, lambda: list_service_users(client, org_id=org, extra_queries=filters.user_queries()))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        users = [pool.submit(_users, org) for org in user_orgs]
+
+        with phase("project listing"):
+            for org, projects in pool.map(_projects, project_orgs):
+                if projects is None:
+                    inv.pending["project_orgs"].append(_org_out(org))
+                    continue
+                for p in projects:
+                    if not filters.match_project(p):
+                        continue
+                    pid = inv.add_project(p, None if org is DEFAULT_ORG else org)
+                    pairs.append((org, pid))
+
+        with phase("app listing"):
+            for org, pid, apps in pool.map(lambda pair: _apps(*pair), pairs):
+                if apps is None:
+                    inv.pending["projects"].append((_org_out(org), inv.projects[pid]))
+                    continue
+                for app in apps:
+                    if filters.match_app(app):
+                        inv.add_app(pid, app)
+
+        with phase("service-user listing"):
+            for org, fut in zip(user_orgs, users):
+                try:
+                    listed = fut.result()
+                    if listed is None:
+                        inv.pending["user_orgs"].append(_org_out(org))
+                        continue
+                    for u in listed:
+                        if filters.match_user(u):
+                            inv.add_user(u)
+                except requests.HTTPError as e:
+                    print(f"# warn: listing service users failed for org {org}: {e}", file=sys.stderr)
+
+    inv.loaded_at = time.time()
+    return inv
+
+
+def crawl_all_orgs(client, with_users=True, workers=WORKERS, filters=None, deadline=None, resume=None):
+    """List the orgs visible to the token once, then crawl all of them concurrently."""
+    return crawl(client, with_users, workers, orgs=list_orgs(client), filters=filters, deadline=deadline,
+                 resume=resume)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Pre-flight permission check: probe, in parallel and with cheap read-only
+calls, everything a workflow is about to need, and fail within a couple of
+seconds with one report instead of a 403 after a full crawl.
+
+    ./zitadel_preflight.py                               # every check
+    ./zitadel_preflight.py project_search user_secret
+
+Write permissions are never exercised; they are read from the token's own
+permission list (auth/v1 ListMyZitadelPermissions for the org in the
+x-zitadel-orgid header). Scripts call require() at the top of main();
+ZITADEL_PREFLIGHT=0 skips it.
+"""
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from zitadel_client import ZitadelClient
+
+PREFLIGHT_TIMEOUT = 3
+ENABLED = os.environ.get("ZITADEL_PREFLIGHT", "1") != "0"
+MY_PERMISSIONS = "/auth/v1/permissions/zitadel/me/_search"
+
+# check -> (what it covers, permission the token needs, read probe (method, path, payload) or None)
+CHECKS = {
+    "project_search": ("project search", "project.read",
+                       ("POST", "/management/v1/projects/_search", {"limit": 1, "queries": []})),
+    "app_secret": ("app secret generation", "project.app.write", None),
+    "user_secret": ("v2 user secret", "user.write",
+                    ("POST", "/v2/users", {"query": {"limit": 1}, "queries": []})),
+    "oidc_config": ("oidc_config update", "project.app.write", None),
+    "member_write": ("org member changes", "org.member.write",
+                     ("POST", "/management/v1/orgs/me/members/_search", {"limit": 1, "queries": []})),
+}
+
+
+class PreflightError(RuntimeError):
+    pass
+
+
+def _probe(client, method, path, payload):
+    try:
+        r = client.request(method, path, payload, timeout=PREFLIGHT_TIMEOUT)
+    except requests.RequestException as e:
+        return False, f"{type(e).__name__}: {e}"
+    if r.status_code < 300:
+        return True, f"{r.status_code}"
+    return False, f"{r.status_code} {r.text[:120].strip()}"
+
+
+def _permissions(client):
+    """(set of permissions, None) or (None, reason) when the token cannot list them."""
+    try:
+        r = client.request("POST", MY_PERMISSIONS, {}, timeout=PREFLIGHT_TIMEOUT)
+    except requests.RequestException as e:
+        return None, f"{type(e).__name__}: {e}"
+    if r.status_code >= 300:
+        return None, f"{r.status_code}"
+    return set(r.json().get("result") or []), None
+
+
+def check(client, names=tuple(CHECKS)):
+    """[(name, label, ok, detail)]; ok is None when it could not be decided."""
+    with ThreadPoolExecutor(max_workers=len(names) + 1) as pool:
+        perms = pool.submit(_permissions, client)
+        probes = {n: pool.submit(_probe, client, *CHECKS[n][2]) for n in names if CHECKS[n][2]}
+        granted, perm_error = perms.result()
+        report = []
+        for n in names:
+            label, permission, _ = CHECKS[n]
+            ok, details = True, []
+            if n in probes:
+                probe_ok, detail = probes[n].result()
+                ok = ok and probe_ok
+                details.append(f"probe {detail}")
+            if granted is None:
+                details.append(f"{permission}: unknown (permission list {perm_error})")
+                ok = None if ok else ok
+            elif permission in granted:
+                details.append(f"{permission}: granted")
+            else:
+                ok = False
+                details.append(f"{permission}: MISSING")
+            report.append((n, label, ok, "; ".join(details)))
+    return report
+
+
+def print_report(report, out=sys.stderr):
+    for _, label, ok, detail in report:
+        status = "ok" if ok else ("??" if ok is None else "FAIL")
+        print(f"# preflight {status:<4} {label:<24} {detail}", file=out)
+
+
+def require(client, *names):
+    """Run the checks a workflow needs; raise PreflightError if any fails."""
+    if not ENABLED:
+        return
+    report = check(client, names or tuple(CHECKS))
+    failed = [label for _, label, ok, _ in report if ok is False]
+    if failed:
+        print_report(report)
+        raise PreflightError(f"pre-flight failed: {', '.join(failed)} (ZITADEL_PREFLIGHT=0 to skip)")
+    if any(ok is None for _, _, ok, _ in report):
+        print_report(report)
+
+
+def main():
+    names = [a for a in sys.argv[1:] if not a.startswith("-")] or list(CHECKS)
+    unknown = [n for n in names if n not in CHECKS]
+    if unknown:
+        sys.exit(f"unknown check(s) {', '.join(unknown)}; choose from {', '.join(CHECKS)}")
+    report = check(ZitadelClient.from_config(), names)
+    print_report(report, sys.stdout)
+    sys.exit(1 if any(ok is False for _, _, ok, _ in report) else 0)
+
+
+if __name__ == "__main__":
+    main()
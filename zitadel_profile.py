@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Per-phase wall/CPU timing and opt-in cProfile / tracemalloc dumps.
+
+Phases are always recorded (two clock reads each); the table is only printed
+when the script runs with --profile:
+
+    ./get_detials_...py --profile
+    ./get_detials_...py --profile=cprofile:run.prof          # + pstats dump
+    ./get_detials_...py --profile=tracemalloc:run.mem        # + memory snapshot
+
+A phase whose CPU time is close to its wall time is bound by our Python
+code; one with little CPU per wall second is waiting on the network.
+"""
+import cProfile
+import contextlib
+import sys
+import threading
+import time
+import tracemalloc
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.phases = {}  # name -> [calls, wall, cpu]
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            with self._lock:
+                rec = self.phases.setdefault(name, [0, 0.0, 0.0])
+                rec[0] += 1
+                rec[1] += wall
+                rec[2] += cpu
+
+    def report(self, out=sys.stderr):
+        print(f"# {'phase':<24}{'calls':>7}{'wall s':>10}{'cpu s':>10}{'cpu/wall':>10}", file=out)
+        for name, (calls, wall, cpu) in self.phases.items():
+            ratio = cpu / wall if wall else 0.0
+            print(f"# {name:<24}{calls:>7}{wall:>10.3f}{cpu:>10.3f}{ratio:>10.2f}", file=out)
+
+
+TIMER = PhaseTimer()
+phase = TIMER.phase
+
+
+def _parse_profile_args(argv):
+    """Strip --profile[=kind:path,...] from argv; returns (enabled, {kind: path})."""
+    enabled, dumps, rest = False, {}, [argv[0]]
+    for arg in argv[1:]:
+        if arg == "--profile":
+            enabled = True
+        elif arg.startswith("--profile="):
+            enabled = True
+            for spec in arg.split("=", 1)[1].split(","):
+                kind, _, path = spec.partition(":")
+                if kind not in ("cprofile", "tracemalloc"):
+                    sys.exit(f"--profile: unknown kind '{kind}' (use cprofile:FILE or tracemalloc:FILE)")
+                dumps[kind] = path or f"zitadel.{kind}"
+        else:
+            rest.append(arg)
+    argv[:] = rest
+    return enabled, dumps
+
+
+def profile_main(main, argv=sys.argv):
+    """Run ``main()`` honouring --profile; prints the phase table even if main() fails."""
+    enabled, dumps = _parse_profile_args(argv)
+    if not enabled:
+        return main()
+    profiler = cProfile.Profile() if "cprofile" in dumps else None
+    if "tracemalloc" in dumps:
+        tracemalloc.start(25)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        if profiler:
+            return profiler.runcall(main)
+        return main()
+    finally:
+        TIMER.report()
+        print(f"# {'total':<24}{'':>7}{time.perf_counter() - wall:>10.3f}{time.process_time() - cpu:>10.3f}",
+              file=sys.stderr)
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            snapshot.dump(dumps["tracemalloc"])
+            print(f"# tracemalloc peak {peak / 1e6:.1f} MB, snapshot written to {dumps['tracemalloc']}",
+                  file=sys.stderr)
+            for stat in snapshot.statistics("lineno")[:10]:
+                print(f"#   {stat}", file=sys.stderr)
+        if profiler:
+            profiler.dump_stats(dumps["cprofile"])
+            print(f"# cProfile stats written to {dumps['cprofile']} (python -m pstats)", file=sys.stderr)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+One request budget per Zitadel domain, shared by every process on the box.
+
+Cron and CI jobs that overlap would each pace themselves on their own and
+still overload the instance together. With ``rate_limit = 20`` in
+[zitadel] (or ZITADEL_RATE_LIMIT=20) every client request first takes a
+send slot from a flock-protected JSON state file (the same pattern as the
+token cache) at ZITADEL_RATE_STATE:
+
+  - all jobs against one domain share ``rate_limit`` requests per second;
+  - the budget is fair-shared: each process that sent within the last
+    ACTIVE_WINDOW seconds gets an equal part of it, so a bulk rotation
+    cannot starve an export that starts next to it; when the others go
+    quiet (or exit) it gets the whole budget again.
+
+Give every job on the host the same rate_limit for a domain.
+"""
+import atexit
+import os
+import time
+
+from zitadel_auth import TokenCache
+
+RATE_LIMIT = float(os.environ.get("ZITADEL_RATE_LIMIT", "0") or 0)  # requests/s per domain, 0 = off
+RATE_STATE = os.environ.get("ZITADEL_RATE_STATE", os.path.expanduser("~/.cache/zitadel/ratelimit.json"))
+ACTIVE_WINDOW = 2.0   # seconds without a request after which a process no longer gets a share
+
+
+class SharedRateLimit:
+    """
+    Pacing on a shared file: each active process sends its requests
+    (active processes / rate) seconds apart, so together they stay at
+    ``rate``. A single high-water mark for the whole domain would waste
+    the gaps between the slots of different processes.
+    """
+
+    def __init__(self, domain, rate, path=RATE_STATE):
+        self.domain = domain
+        self.rate = float(rate)
+        self.state = TokenCache(path)  # flock-protected JSON file
+        self.pid = str(os.getpid())
+        self.waited = 0.0
+        atexit.register(self.close)
+
+    def _reserve(self):
+        """Claim the next slot; returns the time.time() at which it may be used."""
+        with self.state:
+            entries = self.state.read()
+            now = time.time()
+            dom = entries.setdefault(self.domain, {"procs": {}})
+            procs = {pid: p for pid, p in dom["procs"].items()
+                     if pid == self.pid or p["seen"] > now - ACTIVE_WINDOW}
+            me = procs.setdefault(self.pid, {"next": 0.0})
+            slot = max(now, me["next"])
+            me["next"] = slot + len(procs) / self.rate
+            me["seen"] = slot
+            dom["procs"] = procs
+            self.state.write(entries)
+        return slot
+
+    def acquire(self):
+        delay = self._reserve() - time.time()
+        if delay > 0:
+            self.waited += delay
+            time.sleep(delay)
+
+    def close(self):
+        """Leave the share at exit so the other jobs get the whole budget back."""
+        with self.state:
+            entries = self.state.read()
+            if entries.get(self.domain, {}).get("procs", {}).pop(self.pid, None) is not None:
+                self.state.write(entries)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Serve a ZITADEL_CAPTURE recording back as a local stand-in for Zitadel, so
+crawl / rotation changes can be benchmarked offline against
+production-shaped responses.
+
+    ZITADEL_CAPTURE=prod.jsonl ./inventory_export.py --all-orgs    # once, against the real instance
+    ./zitadel_replay.py prod.jsonl --port 8998 --latency 1.0       # original latency
+    ./zitadel_replay.py prod.jsonl --latency 0.5                   # twice as fast
+    # zitadel.conf: domain = http://127.0.0.1:8998
+
+Requests are matched on method, path, org header and request body; when the
+body differs (other offsets, new queries) the first recording of the same
+method + path is used. Repeated identical requests cycle through their
+recordings. Each response is delayed by its recorded total time times
+--latency. "<scrubbed>" values come back as fresh random strings so
+rotation code still sees a secret, and /oauth/v2/token always issues a
+dummy token.
+"""
+import argparse
+import collections
+import itertools
+import json
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from zitadel_capture import SCRUBBED
+
+
+def _key(method, path, org, body):
+    return method, path, org or "", json.dumps(body, sort_keys=True) if body is not None else ""
+
+
+def unscrub(obj):
+    if obj == SCRUBBED:
+        return secrets.token_urlsafe(24)
+    if isinstance(obj, dict):
+        return {k: unscrub(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [unscrub(v) for v in obj]
+    return obj
+
+
+class Recording:
+    def __init__(self, path):
+        exact, by_path = collections.defaultdict(list), collections.defaultdict(list)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                exact[_key(rec["method"], rec["path"], rec.get("org"), rec.get("request"))].append(rec)
+                by_path[rec["method"], rec["path"]].append(rec)
+        self.size = sum(len(v) for v in exact.values())
+        self._lock = threading.Lock()
+        self._exact = {k: itertools.cycle(v) for k, v in exact.items()}
+        self._by_path = {k: v[0] for k, v in by_path.items()}
+        self.misses = 0
+
+    def find(self, method, path, org, body):
+        with self._lock:
+            it = self._exact.get(_key(method, path, org, body))
+            if it:
+                return next(it)
+            rec = self._by_path.get((method, path))
+            if rec is None:
+                self.misses += 1
+            return rec
+
+
+def make_handler(recording, latency):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status, body, content_type="application/json", delay=0.0):
+            if delay > 0:
+                time.sleep(delay)
+            if isinstance(body, dict) and "_text" in body:
+                data = body["_text"].encode()
+            else:
+                data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if self.path.startswith("/oauth/v2/token"):
+                return self._send(200, {"access_token": secrets.token_urlsafe(32), "token_type": "Bearer",
+                                        "expires_in": 3600})
+            try:
+                body = json.loads(raw) if raw else None
+            except ValueError:
+                body = None
+            rec = recording.find(self.command, self.path, self.headers.get("x-zitadel-orgid"), body)
+            if rec is None:
+                return self._send(404, {"code": 5, "message": f"not in recording: {self.command} {self.path}"})
+            self._send(rec["status"], unscrub(rec.get("body") or {}), rec.get("content_type", "application/json"),
+                       rec.get("total_ms", 0) / 1000.0 * latency)
+
+        do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    return ReplayHandler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay a captured Zitadel session locally.")
+    ap.add_argument("capture", help="JSONL written with ZITADEL_CAPTURE")
+    ap.add_argument("--port", type=int, default=8998)
+    ap.add_argument("--latency", type=float, default=1.0, help="scale for recorded latencies (0 = none)")
+    args = ap.parse_args()
+
+    recording = Recording(args.capture)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(recording, args.latency))
+    server.daemon_threads = True
+    print(f"# replaying {recording.size} exchanges on http://127.0.0.1:{args.port} "
+          f"at {args.latency:g}x latency", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"# {recording.misses} requests were not in the recording", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Secret rotation on top of the shared client: app client secrets (v1
+_generate_client_secret) and resourceOwner-aware service-user secrets
+(v2 with v1 fallback), used by get_detials_...py and the other rotation
+scripts. With a Connect client (protocol = connect) the v2 calls go through the Connect
+RPCs instead of the REST gateway.
+"""
+import json
+
+from zitadel_client import DEFAULT_ORG
+from zitadel_connect import APP_SERVICE, USER_SERVICE
+from zitadel_inventory import app_type_label, extract
+
+
+def _secret(data):
+    return extract(data, "clientSecret", "secret", "value")
+
+def _v2_request(client, rpc, rpc_payload, method, path, org_id, memo=False):
+    """The v2 call over Connect when the client speaks it, else over REST."""
+    if client.protocol == "connect":
+        return client.rpc_request(rpc, rpc_payload, org_id=org_id, memo=memo)
+    return client.request(method, path, {} if method == "POST" else None, org_id=org_id, memo=memo)
+
+def rotate_app_secret(client, project_id, app, org_id=DEFAULT_ORG):
+    app_id = app.get("id")
+    if client.protocol == "connect":
+        kind = "isOidc" if app_type_label(app) == "OIDC" else "isApi"
+        r = client.rpc_request(f"{APP_SERVICE}/RegenerateClientSecret",
+                               {"projectId": project_id, "applicationId": app_id, kind: True}, org_id=org_id)
+        if r.status_code not in (404, 501):  # v2beta AppService missing: use v1 below
+            r.raise_for_status()
+            return _secret(r.json())
+    if app_type_label(app) == "OIDC":
+        path = f"/management/v1/projects/{project_id}/apps/{app_id}/oidc_config/_generate_client_secret"
+    else:
+        path = f"/management/v1/projects/{project_id}/apps/{app_id}/api_config/_generate_client_secret"
+    return _secret(client.post(path, {}, org_id=org_id))
+
+# ------ ResourceOwner-aware secret rotation for service users ------
+def _extract_user(payload):
+    # v2 may return flat or wrapped under "user"
+    return payload.get("user", payload)
+
+def _is_machine(u):
+    t = (u.get("type") or u.get("userType") or "").upper()
+    return ("MACHINE" in t) or ("machine" in u)
+
+def resource_owner(payload):
+    details = payload.get("details") or payload.get("user", {}).get("details") or {}
+    return details.get("resourceOwner") or payload.get("resourceOwner")
+
+def get_user(client, user_id, org_hint=None):
+    # Try with org hint then without
+    for org in (org_hint, None):
+        r = _v2_request(client, f"{USER_SERVICE}/GetUserByID", {"userId": user_id},
+                        "GET", f"/v2/users/{user_id}", org, memo=True)
+        if r.status_code == 404:
+            continue
+        r.raise_for_status()
+        return r.json()
+    raise RuntimeError(f"user_id '{user_id}' not found in visible orgs")
+
+def rotate_service_user_secret(client, user_id, org_hint=None, owner=None):
+    """
+    - GET /v2/users/{id} to find resourceOwner (skipped when ``owner`` is known)
+    - POST /v2/users/{id}/secret with owning org header, fallback w/o header
+    - Fallback to PUT /management/v1/users/{id}/secret with owning org header
+    """
+    org_hint = org_hint or client.org_id
+    if owner is None:
+        payload = get_user(client, user_id, org_hint)
+        u = _extract_user(payload)
+        owner = resource_owner(payload) or org_hint
+        if not _is_machine(u):
+            kind = (u.get("type") or u.get("userType") or "UNKNOWN")
+            state = u.get("state") or "UNKNOWN"
+            raise RuntimeError(f"user '{user_id}' is not MACHINE (type={kind}, state={state})")
+
+    for try_org in (owner, None):
+        r = _v2_request(client, f"{USER_SERVICE}/AddSecret", {"userId": user_id},
+                        "POST", f"/v2/users/{user_id}/secret", try_org)
+        if r.status_code == 404:
+            # org-mismatch or masked lack of write; try next variant
+            continue
+        if r.status_code == 403:
+            raise RuntimeError("403 Forbidden: token lacks 'user.write' in this org.")
+        r.raise_for_status()
+        data = r.json()
+        secret = _secret(data)
+        if not secret:
+            raise RuntimeError(f"No secret in response: {json.dumps(data)}")
+        return secret
+
+    r = client.request("PUT", f"/management/v1/users/{user_id}/secret", {}, org_id=owner)
+    if r.status_code == 404:
+        raise RuntimeError("Not found via v1 either: org mismatch or deleted user.")
+    if r.status_code == 403:
+        raise RuntimeError("Forbidden via v1: need 'user.write' on this org.")
+    r.raise_for_status()
+    data = r.json()
+    secret = _secret(data)
+    if not secret:
+        raise RuntimeError(f"No secret in mgmt v1 response: {json.dumps(data)}")
+    return secret
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import argparse
 import csv
 import os
 import sys
@@ -6,19 +7,37 @@ import time
 import requests
 from typing import Dict, List, Optional
 
-DOMAIN = os.getenv("ZITADEL_DOMAIN", "https://app241dev-zitadel.int.capoptix.com")
-ACCESS_TOKEN = os.getenv("ZITADEL_ACCESS_TOKEN", "7wl7afoRxv7ltT1tADlCU_WYAp9S-1gzYBfSU9PzyGiylEazX0rGZa8HxSQRdOt8hCqTdZI")
-ORG_ID = os.getenv("ZITADEL_ORG_ID", "301926074198032394")
+from zitadel_auth import StaticToken, auth_from_config
+from zitadel_client import load_config
+from zitadel_inventory import SearchFilter
+from zitadel_profile import phase, profile_main
+
+# zitadel.conf, with the ZITADEL_* environment variables taking precedence
+CONF = load_config("zitadel.conf")
+DOMAIN = os.getenv("ZITADEL_DOMAIN", CONF.get("domain", "https://app241dev-zitadel.int.capoptix.com")).rstrip("/")
+ORG_ID = os.getenv("ZITADEL_ORG_ID", CONF.get("org_id", "301926074198032394"))
 PAGE_SIZE = 100
+TIMEOUT = 30  # a stalled call must not hold the run forever
 OUT = "zitadel_new_secrets.csv"
 
-# if ACCESS_TOKEN == "REPLACE_ME" or not ACCESS_TOKEN.strip():
-#     sys.exit("ERROR: Provide a valid ZITADEL_ACCESS_TOKEN.")
+def token_source():
+    if os.getenv("ZITADEL_ACCESS_TOKEN"):
+        return StaticToken(os.environ["ZITADEL_ACCESS_TOKEN"])
+    if not CONF:
+        sys.exit("ERROR: set ZITADEL_ACCESS_TOKEN or provide zitadel.conf")
+    return auth_from_config({**CONF, "domain": DOMAIN})
 
 def session_with_headers() -> requests.Session:
+    auth = token_source()
+
+    def bearer(request):
+        # per request, so a minted token is refreshed on long runs
+        request.headers["Authorization"] = f"Bearer {auth.token()}"
+        return request
+
     session = requests.Session()
+    session.auth = bearer
     session.headers.update({
-        "Authorization": f"Bearer {ACCESS_TOKEN}",
         "Content-Type": "application/json",
         "Accept": "application/json",
         "x-zitadel-orgid": ORG_ID,
@@ -32,12 +51,12 @@ def safe_get(data: Dict, path: str, default=None):
         data = data[key]
     return data
 
-def fetch_paginated_data(session: requests.Session, url: str) -> List[Dict]:
+def fetch_paginated_data(session: requests.Session, url: str, queries: Optional[List[Dict]] = None) -> List[Dict]:
     results = []
     next_token = ""
     while True:
         full_url = f"{url}&pageToken={next_token}" if next_token else url
-        response = session.post(full_url, json={"queries": []})
+        response = session.post(full_url, json={"queries": queries or []}, timeout=TIMEOUT)
         response.raise_for_status()
         data = response.json()
         results.extend(data.get("result", []))
@@ -53,7 +72,8 @@ def regenerate_secret(session: requests.Session, project_id: str, app_id: str, a
     headers = {"Connect-Protocol-Version": "1"}
     for url, extra_headers in [(v2_url, headers), (v1_url, None)]:
         try:
-            response = session.post(url, json={"projectId": project_id, "appId": app_id}, headers=extra_headers)
+            response = session.post(url, json={"projectId": project_id, "appId": app_id}, headers=extra_headers,
+                                    timeout=TIMEOUT)
             if response.status_code == 200:
                 data = response.json()
                 return data.get("clientSecret") or data.get("secret") or safe_get(data, "value", "-")
@@ -62,6 +82,13 @@ def regenerate_secret(session: requests.Session, project_id: str, app_id: str, a
     return None
 
 def main():
+    ap = argparse.ArgumentParser(description="Regenerate the client secret of every OIDC/API app in the org.")
+    ap.add_argument("--project", help="only projects whose name matches (fnmatch, pushed to the server)")
+    ap.add_argument("--app", help="only apps whose name matches (fnmatch, pushed to the server)")
+    ap.add_argument("--app-type", choices=("OIDC", "API"), type=str.upper, help="checked locally (no server query)")
+    args = ap.parse_args()
+    filters = SearchFilter(args.project, args.app, args.app_type)
+
     session = session_with_headers()
     projects_url = f"{DOMAIN}/management/v1/projects/_search?pageSize={PAGE_SIZE}"
     apps_url_template = f"{DOMAIN}/management/v1/projects/{{}}/apps/_search?pageSize={PAGE_SIZE}"
@@ -70,24 +97,36 @@ def main():
         writer = csv.writer(file)
         writer.writerow(["org_id", "project_id", "project_name", "app_id", "app_name", "app_type", "client_id", "new_secret"])
 
-        for project in fetch_paginated_data(session, projects_url):
+        with phase("project listing"):
+            projects = fetch_paginated_data(session, projects_url, filters.project_queries())
+        for project in projects:
+            if not filters.match_project(project):
+                continue
             project_id = project.get("id", "-")
             project_name = project.get("name", "-")
             print(f"\nProject: {project_id} | {project_name}")
 
-            for app in fetch_paginated_data(session, apps_url_template.format(project_id)):
-                app_id = app.get("id", "-")
-                app_name = app.get("name", "-")
-                app_type = app.get("appType") or app.get("type", "-")
-                client_id = safe_get(app, "oidcConfig.clientId") or safe_get(app, "apiConfig.clientId") or app.get("clientId", "-")
+            with phase("app listing"):
+                apps = fetch_paginated_data(session, apps_url_template.format(project_id), filters.app_queries())
+            for app in apps:
+                if not filters.match_app(app):
+                    continue
+                with phase("normalization"):
+                    app_id = app.get("id", "-")
+                    app_name = app.get("name", "-")
+                    app_type = app.get("appType") or app.get("type", "-")
+                    client_id = safe_get(app, "oidcConfig.clientId") or safe_get(app, "apiConfig.clientId") or app.get("clientId", "-")
 
                 if app_type not in ("OIDC", "API"):
                     print(f"  Skip (no secret): {app_id} | {app_name} | {app_type}")
-                    writer.writerow([ORG_ID, project_id, project_name, app_id, app_name, app_type, client_id, "-"])
+                    with phase("csv writing"):
+                        writer.writerow([ORG_ID, project_id, project_name, app_id, app_name, app_type, client_id, "-"])
                     continue
 
-                new_secret = regenerate_secret(session, project_id, app_id, app_type) or "-"
-                writer.writerow([ORG_ID, project_id, project_name, app_id, app_name, app_type, client_id, new_secret])
+                with phase("rotation"):
+                    new_secret = regenerate_secret(session, project_id, app_id, app_type) or "-"
+                with phase("csv writing"):
+                    writer.writerow([ORG_ID, project_id, project_name, app_id, app_name, app_type, client_id, new_secret])
                 if new_secret != "-":
                     print(f"  Rotated: {app_id} | {app_name} | New secret captured")
                 time.sleep(0.05)
@@ -96,7 +135,7 @@ def main():
 
 if __name__ == "__main__":
     try:
-        main()
+        profile_main(main)
     except requests.HTTPError as e:
         sys.exit(f"HTTP error: {e} | Response: {getattr(e.response, 'text', '')}")
     except Exception as e: